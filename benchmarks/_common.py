@@ -0,0 +1,24 @@
+"""Shared helpers for the offline benchmark and regression scripts."""
+import os
+import sys
+
+from _fixtures import BENCH_DIR
+
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import final  # noqa: E402
+
+EXTRACTORS = {
+    "liga_odds": final.extract_liga_odds,
+    "relevo_news": final.extract_relevo_news,
+    "relevo_article": final.extract_relevo_article,
+    "tables_liga": final.extract_tablesleague_data,
+    "transfermarkt_general": final.extract_transfermarkt_general_odds,
+}
+
+
+def run_extract(name, html, parser=None, scoped=True):
+    extract = EXTRACTORS[name]
+    if name in final.PARSE_SCOPES:
+        return extract(html, parser=parser, scoped=scoped)
+    return extract(html, parser=parser)
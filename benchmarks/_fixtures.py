@@ -0,0 +1,35 @@
+"""Fixture paths and routes; kept apart from ``_common`` so importing them does not import ``final``.
+
+The pages in ``fixtures/`` are synthetic: hand-built to mimic the markup the extractors target
+(class names, table layout, widget structure) with invented content, not recorded from the
+real sites. The goldens built from them only show the extractors are stable on that markup;
+they cannot detect drift in the live pages, which still has to be checked against the sites.
+"""
+import os
+import re
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+GOLDEN_DIR = os.path.join(BENCH_DIR, "golden")
+
+# Ruta de cada fixture en el servidor local, igual que en el sitio real
+FIXTURE_ROUTES = {
+    "/apuestas/la-liga/": "liga_odds",
+    "/apuestas/cuotas/": "transfermarkt_general",
+    "/futbol/mercado-fichajes/": "relevo_news",
+    "/tables/": "tables_liga",
+}
+# El resto de ligas comparten la maqueta de La Liga
+FIXTURE_ROUTES.update({f"/apuestas/{slug}/": "liga_odds" for slug in
+                       ("premier-league", "serie-a", "bundesliga", "ligue-1", "champions-league")})
+
+
+def load_fixture(name, binary=False):
+    with open(os.path.join(FIXTURES_DIR, f"{name}.html"), "rb" if binary else "r",
+              **({} if binary else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+
+# Cada artículo del listado de Relevo sirve la misma página de detalle (modo profundo)
+FIXTURE_ROUTES.update({path: "relevo_article" for path in re.findall(
+    r'class="article__title"><a href="(/[^"]+)"', load_fixture("relevo_news"))})
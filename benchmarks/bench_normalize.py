@@ -0,0 +1,125 @@
+"""Micro-benchmark of the text-normalization helpers against their original versions.
+
+The inputs are the raw strings the extractors feed to each helper, harvested from the synthetic
+fixture pages and repeated ``--scale`` times (a page with many leagues and cards repeats the
+same odds, dates and headers). Every helper must return exactly what the original returned;
+the script reports the median time per call cold (caches cleared) and warm, and exits with
+status 1 if any output differs.
+
+    python benchmarks/bench_normalize.py --scale 50
+"""
+import argparse
+import logging
+import re
+import statistics
+import sys
+import time
+
+from dateutil.parser import parse
+
+from _common import final
+from _fixtures import load_fixture
+
+
+# Versiones originales (antes de la sección de normalización), como referencia
+def legacy_clean_odd_value(odd_text):
+    if not odd_text:
+        return "N/A"
+    odd_text = odd_text.strip().replace('\xa0', ' ').replace('\u00a0', ' ')
+    match = re.search(r'(\d+\.?\d*)', odd_text)
+    return match.group(1) if match else odd_text
+
+
+def legacy_parse_match_date_liga(date_str):
+    if not date_str:
+        return "N/A"
+    try:
+        return parse(date_str.split('-')[0].strip(), dayfirst=True).strftime('%Y-%m-%d %H:%M')
+    except Exception:
+        return date_str
+
+
+def legacy_parse_relevo_date(date_str):
+    if not date_str:
+        return "N/A"
+    try:
+        return parse(date_str).strftime('%Y-%m-%d %H:%M:%S')
+    except Exception:
+        return date_str
+
+
+def legacy_parse_match_date_transfermarkt_general(date_str):
+    try:
+        return parse(date_str).strftime('%Y-%m-%d %H:%M')
+    except Exception:
+        return date_str
+
+
+LEGACY_COLUMN_MAP = dict(final.TABLE_COLUMN_MAP)
+
+
+def legacy_normalize_column_header(text):
+    return LEGACY_COLUMN_MAP.get(text.upper(), text)
+
+
+def corpus():
+    """Raw inputs per helper, taken from the fixtures plus a few edge cases."""
+    liga, relevo = load_fixture("liga_odds"), load_fixture("relevo_news")
+    general, tables = load_fixture("transfermarkt_general"), load_fixture("tables_liga")
+    liga_dates = re.findall(r'<td>([^<]*\d{1,2}:\d{2}[^<]*)</td>', liga)
+    relevo_dates = re.findall(r'datetime="([^"]+)"', relevo)
+    odds = re.findall(r' - (\d+[.,]?\d*)</div>', general) + re.findall(r'<td>\s*(\d+[.,]\d+)\s*</td>', liga)
+    headers = re.findall(r'<div class="cell">([^<]{1,12})</div>', tables)
+    edge = ["", "N/A", "mañana - 20:00", "31/02/2026 20:00 - Jornada 1"]
+    return {
+        "clean_odd_value": (legacy_clean_odd_value, odds + ["\xa01.5 ", "sin cuota", ""]),
+        "parse_match_date_liga": (legacy_parse_match_date_liga, liga_dates + edge),
+        "parse_relevo_date": (legacy_parse_relevo_date, relevo_dates + edge + ["2026-10-10 08:00"]),
+        "parse_match_date_transfermarkt_general": (legacy_parse_match_date_transfermarkt_general,
+                                                   relevo_dates + ["17 Oct 2026 20:00", "2026-10-17T20:00:00Z"]),
+        "normalize_column_header": (legacy_normalize_column_header, headers or ["#", "Team", "PTS", "gd"]),
+    }
+
+
+def per_call_us(fn, inputs, repeat, clear=None):
+    timings = []
+    for _ in range(repeat):
+        if clear:
+            clear()
+        started = time.perf_counter()
+        for value in inputs:
+            fn(value)
+        timings.append((time.perf_counter() - started) / len(inputs) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (default: 5)")
+    arg_parser.add_argument("--scale", type=int, default=20, help="times each input repeats (default: 20)")
+    args = arg_parser.parse_args()
+    final.logger.setLevel(logging.ERROR)
+
+    mismatches = 0
+    print(f"{'helper':<40}{'inputs':>8}{'legacy µs':>12}{'cold µs':>10}{'warm µs':>10}{'speedup':>10}")
+    for name, (legacy, values) in corpus().items():
+        helper = getattr(final, name)
+        clear = getattr(helper, "cache_clear", None)  # normalize_column_header no se memoiza
+        for value in values:
+            if clear:
+                clear()
+            if (expected := legacy(value)) != (actual := helper(value)):
+                mismatches += 1
+                print(f"  DIFFERS {name}({value!r}): {expected!r} != {actual!r}")
+        inputs = values * args.scale
+        base = per_call_us(legacy, inputs, args.repeat)
+        cold = per_call_us(helper, values, args.repeat, clear=clear)
+        warm = per_call_us(helper, inputs, args.repeat)
+        print(f"{name:<40}{len(inputs):>8}{base:>12.2f}{cold:>10.2f}{warm:>10.2f}{base / warm:>9.1f}x")
+    if mismatches:
+        print(f"\n{mismatches} input(s) normalized differently from the original helpers.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Side-by-side benchmark of the HTML parser backends over the synthetic fixture pages.
+
+For every scraper the reference output is ``extract_*`` with the original full-document
+``html.parser`` tree. Each candidate backend (parser x scoped/full parsing) must produce
+exactly the same result; the script reports median parse+extract time and peak traced
+memory per scraper and exits with status 1 if any output differs.
+
+    python benchmarks/bench_parsers.py --repeat 20
+"""
+import argparse
+import importlib.util
+import logging
+import statistics
+import sys
+import time
+import tracemalloc
+
+from _common import EXTRACTORS, final, run_extract
+from _fixtures import load_fixture
+
+
+def available_parsers():
+    parsers = ["html.parser"]
+    if importlib.util.find_spec("lxml"):
+        parsers.append("lxml")
+    else:
+        print("lxml no está instalado; solo se mide 'html.parser'.")
+    return parsers
+
+
+def measure(name, html, parser, scoped, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run_extract(name, html, parser, scoped)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    output = run_extract(name, html, parser, scoped)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return output, statistics.median(timings), peak / 1024
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=10, help="runs per measurement (default: 10)")
+    arg_parser.add_argument("--scraper", choices=sorted(EXTRACTORS), action="append",
+                            help="limit to one or more scrapers")
+    args = arg_parser.parse_args()
+    # Los extractores registran avisos; no deben ensuciar la tabla
+    final.logger.setLevel(logging.ERROR)
+
+    parsers = available_parsers()
+    mismatches = 0
+    print(f"{'scraper':<24}{'backend':<22}{'median ms':>12}{'peak KiB':>12}{'speedup':>10}  output")
+    for name in args.scraper or EXTRACTORS:
+        html = load_fixture(name)
+        reference, base_ms, base_kib = measure(name, html, "html.parser", False, args.repeat)
+        print(f"{name:<24}{'html.parser (full)':<22}{base_ms:>12.2f}{base_kib:>12.0f}{1.0:>9.1f}x  reference")
+        for parser in parsers:
+            for scoped in ([False, True] if name in final.PARSE_SCOPES else [False]):
+                if parser == "html.parser" and not scoped:
+                    continue
+                output, ms, kib = measure(name, html, parser, scoped, args.repeat)
+                same = output == reference
+                mismatches += not same
+                label = f"{parser} ({'scoped' if scoped else 'full'})"
+                print(f"{'':<24}{label:<22}{ms:>12.2f}{kib:>12.0f}{base_ms / ms:>9.1f}x  "
+                      f"{'identical' if same else 'DIFFERS'}")
+    if mismatches:
+        print(f"\n{mismatches} backend(s) produced output different from html.parser.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Offline benchmark of the four scrapers' parse and extract stages over the synthetic fixtures.
+
+Uses the same ``timed()`` spans as production, so ``parse`` is the BeautifulSoup build and
+``extract`` the exclusive time of the extraction loop. Also reports peak traced memory and
+the number of allocations still alive after the call (tracemalloc snapshot diff).
+
+    python benchmarks/bench_scrapers.py --repeat 20
+"""
+import argparse
+import gc
+import logging
+import statistics
+import tracemalloc
+
+from _common import EXTRACTORS, final
+from _fixtures import load_fixture
+
+
+def run_with_spans(extract, html):
+    final._timing_state.spans = []
+    try:
+        output = final.timed_extract(extract, html)
+        spans = dict.fromkeys(("parse", "extract"), 0.0)
+        for stage, seconds in final._timing_state.spans:
+            spans[stage] = spans.get(stage, 0.0) + seconds
+        return output, spans
+    finally:
+        final._timing_state.spans = None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=10, help="runs per scraper (default: 10)")
+    arg_parser.add_argument("--scraper", choices=sorted(EXTRACTORS), action="append",
+                            help="limit to one or more scrapers")
+    args = arg_parser.parse_args()
+    final.logger.setLevel(logging.ERROR)
+
+    print(f"parser: {final.HTML_PARSER}")
+    print(f"{'scraper':<24}{'KiB in':>8}{'parse ms':>10}{'extract ms':>12}{'total ms':>10}"
+          f"{'peak KiB':>10}{'blocks':>9}{'items':>7}")
+    for name in args.scraper or EXTRACTORS:
+        html = load_fixture(name)
+        extract = EXTRACTORS[name]
+        parse_ms, extract_ms = [], []
+        for _ in range(args.repeat):
+            _, spans = run_with_spans(extract, html)
+            parse_ms.append(spans["parse"] * 1000)
+            extract_ms.append(spans["extract"] * 1000)
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        output, _ = run_with_spans(extract, html)
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        # Solo cuentan los bloques asignados durante la llamada y aún vivos (el resultado),
+        # sin la contabilidad de tracemalloc ni la propia instantánea anterior
+        own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        diff = after.filter_traces(own).compare_to(before.filter_traces(own), "filename")
+        retained_blocks = sum(stat.count_diff for stat in diff)
+        items = sum(len(v) for v in output.values() if isinstance(v, list))
+
+        p, e = statistics.median(parse_ms), statistics.median(extract_ms)
+        print(f"{name:<24}{len(html.encode('utf-8')) / 1024:>8.0f}{p:>10.2f}{e:>12.2f}{p + e:>10.2f}"
+              f"{peak / 1024:>10.0f}{retained_blocks:>9}{items:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Import and startup time of the API per deployment profile (``full`` vs ``http``).
+
+Every run is a fresh interpreter: it times ``import final``, the FastAPI lifespan startup
+and a first ``/raspar-tablas-liga`` request against the local stand-in server, and reports
+whether Selenium ended up imported plus the peak RSS. Medians over ``--repeat`` runs.
+
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --importtime       # heaviest direct imports of final
+    python benchmarks/bench_startup.py --warm 1           # include the browser warm-up (needs Chrome)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from _fixtures import BENCH_DIR
+from standin_server import start_standin
+
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+CHILD = r"""
+import json, resource, sys, time
+started = time.perf_counter()
+import final
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(final.app)
+booting = time.perf_counter()
+with client:
+    booted = time.perf_counter()
+    status = client.get("/raspar-tablas-liga").status_code
+    served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000, "startup_ms": (booted - booting) * 1000,
+    "first_request_ms": (served - booted) * 1000, "status": status,
+    "selenium": any(m == "selenium" or m.startswith("selenium.") for m in sys.modules),
+    "modules": len(sys.modules), "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def child_env(profile, base_url, warm):
+    scratch = tempfile.mkdtemp(prefix="scrapnew-startup-")
+    return {**os.environ,
+            "DEPLOYMENT_PROFILE": profile, "DRIVER_POOL_WARM": str(warm),
+            "TRANSFERMARKT_BASE_URL": base_url, "RELEVO_BASE_URL": base_url, "TABLESLEAGUE_URL": f"{base_url}/tables/",
+            "SNAPSHOT_DB_PATH": os.path.join(scratch, "snapshots.db"),
+            "ARTICLE_CACHE_PATH": os.path.join(scratch, "articles.db"),
+            "SCHEDULER_ENABLED": "false", "LOG_LEVEL": "ERROR"}
+
+
+def run_child(profile, base_url, warm):
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=REPO_DIR, env=child_env(profile, base_url, warm),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def heaviest_imports(profile, base_url, top):
+    """``(cumulative_ms, module)`` of the slowest modules imported directly by ``final``."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import final"], cwd=REPO_DIR,
+                            env=child_env(profile, base_url, 0), capture_output=True, text=True, check=True).stderr
+    direct = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("   ") and not name.startswith("    ") and cumulative.strip().isdigit():
+            direct.append((int(cumulative) / 1000, name.strip()))
+    return sorted(direct, reverse=True)[:top]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per profile (default: 3)")
+    arg_parser.add_argument("--profile", choices=["full", "http"], action="append", help="limit to one profile")
+    arg_parser.add_argument("--warm", type=int, default=0, help="DRIVER_POOL_WARM for the full profile (default: 0)")
+    arg_parser.add_argument("--importtime", action="store_true", help="also list the heaviest imports")
+    args = arg_parser.parse_args()
+
+    standin, base_url = start_standin()
+    profiles = args.profile or ["full", "http"]
+    print(f"{'profile':<10}{'import ms':>11}{'startup ms':>12}{'1st req ms':>12}{'modules':>9}{'RSS MiB':>9}  selenium")
+    for profile in profiles:
+        runs = [run_child(profile, base_url, args.warm if profile == "full" else 0) for _ in range(args.repeat)]
+        median = {key: statistics.median(run[key] for run in runs)
+                  for key in ("import_ms", "startup_ms", "first_request_ms", "modules", "rss_mb")}
+        print(f"{profile:<10}{median['import_ms']:>11.1f}{median['startup_ms']:>12.1f}{median['first_request_ms']:>12.1f}"
+              f"{median['modules']:>9.0f}{median['rss_mb']:>9.1f}  {'sí' if any(r['selenium'] for r in runs) else 'no'}")
+    if args.importtime:
+        for profile in profiles:
+            print(f"\nImports directos más lentos de final ({profile}):")
+            for ms, name in heaviest_imports(profile, base_url, 10):
+                print(f"  {ms:>8.1f} ms  {name}")
+    standin.shutdown()
+
+
+if __name__ == "__main__":
+    main()
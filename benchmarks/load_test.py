@@ -0,0 +1,128 @@
+"""End-to-end load test of the API against the local fixture stand-in server.
+
+Starts ``standin_server`` and, unless ``--api-url`` is given, the API itself in-process
+with its upstream URLs pointed at the stand-in. Then hits the ``/raspar-*`` endpoints and
+the ``/v2`` submit-and-poll flow concurrently and reports latency percentiles, throughput
+and status codes per endpoint.
+
+    python benchmarks/load_test.py --requests 200 --concurrency 16
+    python benchmarks/load_test.py --no-cache --latency 0.05   # every request scrapes
+    python benchmarks/load_test.py --scheduler --latency 0.5   # cache pre-warmed in the background
+    python benchmarks/load_test.py --limits --no-cache         # rate limits and upstream budget on
+
+A single client would trip the API's rate limiter and the upstream budget, so both are
+disabled unless ``--limits`` is given.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from standin_server import start_standin
+
+ENDPOINTS = [
+    "/raspar-cuotas-liga",
+    "/raspar-noticias-relevo",
+    "/raspar-tablas-liga",
+    "/raspar-cuotas-generales-transfermarkt",
+]
+
+
+def start_api(base_url, no_cache, scheduler, limits):
+    """Configure ``final`` through its environment variables and serve it with uvicorn."""
+    os.environ.update({
+        "TRANSFERMARKT_BASE_URL": base_url,
+        "RELEVO_BASE_URL": base_url,
+        "TABLESLEAGUE_URL": f"{base_url}/tables/",
+        "DRIVER_POOL_WARM": "0",
+        "SNAPSHOT_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="scrapnew-load-"), "snapshots.db"),
+        "LOG_LEVEL": "WARNING",
+        "SCHEDULER_ENABLED": "true" if scheduler else "false",
+        "RATE_LIMIT_ENABLED": "true" if limits else "false",
+        "UPSTREAM_BUDGET_ENABLED": "true" if limits else "false",
+    })
+    if no_cache:
+        os.environ.update({"CACHE_TTL_SECONDS": "0", "CACHE_STALE_SECONDS": "0"})
+    import uvicorn
+    from _common import final
+
+    server = uvicorn.Server(uvicorn.Config(final.app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def hit_endpoint(session, api_url, path):
+    started = time.perf_counter()
+    response = session.get(api_url + path, timeout=120)
+    return path, response.status_code, time.perf_counter() - started
+
+
+def run_task(session, api_url, scraper_name):
+    """Submit a /v2 task and poll it until it leaves pending/running."""
+    started = time.perf_counter()
+    response = session.post(f"{api_url}/v2/start-scraping-task/{scraper_name}", timeout=30)
+    if response.status_code == 202:
+        location = response.headers["Location"]
+        while (response := session.get(api_url + location, timeout=30)).status_code == 202:
+            time.sleep(0.05)
+    return f"/v2 {scraper_name}", response.status_code, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--requests", type=int, default=100, help="requests per endpoint (default: 100)")
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--tasks", type=int, default=10, help="/v2 tasks per scraper (default: 10)")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="upstream latency in seconds")
+    arg_parser.add_argument("--no-cache", action="store_true", help="disable the result cache")
+    arg_parser.add_argument("--scheduler", action="store_true", help="pre-warm the cache with the background scheduler")
+    arg_parser.add_argument("--limits", action="store_true", help="keep rate limiting and the upstream budget on")
+    arg_parser.add_argument("--api-url", help="load-test an already running API instead")
+    args = arg_parser.parse_args()
+
+    standin, base_url = start_standin(latency=args.latency)
+    api_server, api_url = (None, args.api_url.rstrip("/")) if args.api_url else start_api(base_url, args.no_cache, args.scheduler, args.limits)
+    print(f"stand-in: {base_url}  api: {api_url}")
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    jobs = [(hit_endpoint, path) for path in ENDPOINTS for _ in range(args.requests)]
+    jobs += [(run_task, name) for name in ("tables_liga", "relevo_news") for _ in range(args.tasks)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda job: job[0](session, api_url, job[1]), jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies, statuses = defaultdict(list), defaultdict(Counter)
+    for label, status, seconds in results:
+        latencies[label].append(seconds * 1000)
+        statuses[label][status] += 1
+    print(f"{'endpoint':<44}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  status")
+    for label, values in latencies.items():
+        codes = " ".join(f"{code}x{count}" for code, count in sorted(statuses[label].items()))
+        print(f"{label:<44}{len(values):>6}{statistics.median(values):>9.1f}{percentile(values, 95):>9.1f}"
+              f"{percentile(values, 99):>9.1f}  {codes}")
+    print(f"\n{len(results)} peticiones en {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s)")
+
+    if api_server:
+        api_server.should_exit = True
+    standin.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Golden-output regression check for the extractors over the synthetic fixture pages.
+
+Runs every ``extract_*`` function on its fixture with the production parser settings and
+compares the result with ``golden/<scraper>.json``. Scrapers rendered in the browser are also
+checked on the container fragment that ``final.container_html`` hands back (emulated here with
+the same selectors), which must give the same output as the full page. It also checks that
+every sync endpoint answers ``503`` with ``Retry-After`` once the upstream budget is spent and
+there is no earlier result to fall back to. Exits with status 1 on any difference. The fixtures are synthetic (see ``_fixtures``), so a green run does not mean
+the extractors still match the live sites.
+
+    python benchmarks/regression.py            # compare against the goldens
+    python benchmarks/regression.py --update   # rewrite the goldens after an intended change
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from bs4 import BeautifulSoup
+
+from _common import EXTRACTORS, final, run_extract
+from _fixtures import GOLDEN_DIR, load_fixture
+
+
+def first_difference(expected, actual, path="$"):
+    """Path and values of the first mismatch between two JSON-like values, or None."""
+    if type(expected) is not type(actual):
+        return path, expected, actual
+    if isinstance(expected, dict):
+        for key in sorted(set(expected) | set(actual)):
+            if key not in expected or key not in actual:
+                return f"{path}.{key}", expected.get(key, "<missing>"), actual.get(key, "<missing>")
+            if (diff := first_difference(expected[key], actual[key], f"{path}.{key}")):
+                return diff
+        return None
+    if isinstance(expected, list):
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            if (diff := first_difference(e, a, f"{path}[{i}]")):
+                return diff
+        if len(expected) != len(actual):
+            return f"{path}.length", len(expected), len(actual)
+        return None
+    return None if expected == actual else (path, expected, actual)
+
+
+def container_fragment(html, selectors):
+    """Python equivalent of ``final.CONTAINER_HTML_JS`` over a saved page."""
+    soup = BeautifulSoup(html, final.HTML_PARSER)
+    for selector in selectors:
+        if (nodes := soup.select(selector)):
+            outer = [n for n in nodes if not any(p in nodes for p in n.parents)]
+            return "\n".join(str(n) for n in outer)
+    return html
+
+
+# Endpoint síncrono de cada fuente con presupuesto de origen
+BUDGET_ENDPOINTS = {
+    "liga_odds": "/raspar-cuotas-liga",
+    "relevo_news": "/raspar-noticias-relevo",
+    "tables_liga": "/raspar-tablas-liga",
+    "transfermarkt_general": "/raspar-cuotas-generales-transfermarkt",
+}
+
+
+def check_budget_responses():
+    """Failures among the sync endpoints when the upstream budget is exhausted (no request leaves)."""
+    from fastapi.testclient import TestClient
+
+    final.RATE_LIMIT_ENABLED = False
+    client = TestClient(final.app)
+    failures = 0
+    for key, path in BUDGET_ENDPOINTS.items():
+        host = final.upstream_host(key)
+        while not final.upstream_budget.take(host):  # se gasta todo el presupuesto del host
+            pass
+        response = client.get(path)
+        label = f"  (presupuesto) {key}"
+        if response.status_code == 503 and response.headers.get("Retry-After") \
+                and response.json().get("error") == final.UPSTREAM_BUDGET_ERROR:
+            print(f"{label:<40}ok")
+        else:
+            failures += 1
+            print(f"{label:<40}FAIL  {response.status_code} Retry-After={response.headers.get('Retry-After')!r}")
+    return failures
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--update", action="store_true", help="rewrite the golden files")
+    args = arg_parser.parse_args()
+    final.logger.setLevel(logging.ERROR)
+
+    failures = 0
+    for name in EXTRACTORS:
+        html = load_fixture(name)
+        output = run_extract(name, html)
+        golden_path = os.path.join(GOLDEN_DIR, f"{name}.json")
+        if args.update:
+            with open(golden_path, "w", encoding="utf-8") as f:
+                json.dump(output, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            print(f"{name:<24}golden actualizado")
+            continue
+        with open(golden_path, encoding="utf-8") as f:
+            golden = json.load(f)
+        if (diff := first_difference(golden, output)):
+            failures += 1
+            path, expected, actual = diff
+            print(f"{name:<24}FAIL  {path}: esperado {expected!r}, obtenido {actual!r}")
+        else:
+            print(f"{name:<24}ok")
+        if (readiness := final.BROWSER_READINESS.get(name)):
+            fragment = run_extract(name, container_fragment(html, readiness["extract"]))
+            if (diff := first_difference(golden, fragment)):
+                failures += 1
+                path, expected, actual = diff
+                print(f"{'  (contenedor)':<24}FAIL  {path}: esperado {expected!r}, obtenido {actual!r}")
+            else:
+                print(f"{'  (contenedor)':<24}ok")
+    if not args.update and final.UPSTREAM_BUDGET_ENABLED:
+        failures += check_budget_responses()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
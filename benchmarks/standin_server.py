@@ -0,0 +1,73 @@
+"""Local stand-in for the scraped sites, serving the synthetic fixture pages.
+
+Every fixture is served at the same path as on the real site, with a strong ``ETag`` so
+conditional GETs get ``304 Not Modified``. Point the API at it with:
+
+    python benchmarks/standin_server.py --port 8765 &
+    TRANSFERMARKT_BASE_URL=http://127.0.0.1:8765 RELEVO_BASE_URL=http://127.0.0.1:8765 \\
+    TABLESLEAGUE_URL=http://127.0.0.1:8765/tables/ python final.py
+"""
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from _fixtures import FIXTURE_ROUTES, load_fixture
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages = {}
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if (page := self.pages.get(self.path.split("?", 1)[0])) is None:
+            self.send_error(404)
+            return
+        body, etag = page
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin(port=0, latency=0.0):
+    """Start the server in a daemon thread; returns ``(server, base_url)``."""
+    pages = {}
+    for route, name in FIXTURE_ROUTES.items():
+        body = load_fixture(name, binary=True)
+        pages[route] = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+    handler = type("Handler", (FixtureHandler,), {"pages": pages, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = arg_parser.parse_args()
+    server, base_url = start_standin(args.port, args.latency)
+    print(f"Sirviendo fixtures en {base_url}: {', '.join(FIXTURE_ROUTES)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
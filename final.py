@@ -1,24 +1,122 @@
 import json
+import copy
+import hashlib
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime, timedelta
-from fastapi import FastAPI, BackgroundTasks # <--- AÑADIDO para tareas en segundo plano
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from starlette.routing import Match
 import time
 import traceback
 import re
 from dateutil.parser import parse
 import uvicorn
 import os
+import sqlite3
+import threading
+import asyncio
+import queue
+import types
+import math
+import io
+import csv
+import urllib.parse
+import uuid
+import functools
+import importlib.util
+import logging
+import logging.handlers
+import atexit
+import random
+import sys
+import signal
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 
-app = FastAPI()
+# --- Logging & Serialization ---
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()  # "text" o "json"
+# Fracción de respuestas cuyo cuerpo completo se registra (a nivel INFO: la tasa ya es la opción explícita)
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0))
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: ``key=value`` text or a JSON object, plus ``extra={"fields": {...}}``."""
+
+    def __init__(self, fmt="text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        fields = {"ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                  "level": record.levelname, "thread": record.threadName, "msg": record.getMessage()}
+        fields.update(getattr(record, "fields", None) or {})
+        if self.fmt == "json":
+            return json.dumps(fields, ensure_ascii=False, default=str)
+        extra = " ".join(f"{k}={v}" for k, v in fields.items() if k not in ("ts", "level", "thread", "msg"))
+        return f"{fields['ts']} {fields['level']:<7} [{fields['thread']}] {fields['msg']}" + (f" | {extra}" if extra else "")
+
+def setup_logging():
+    """Logger whose records are formatted and written to stdout by a background QueueListener."""
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(StructuredFormatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    scraper_logger = logging.getLogger("scrapnew")
+    scraper_logger.setLevel(LOG_LEVEL)
+    scraper_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    scraper_logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+    return scraper_logger
+
+logger = setup_logging()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin locks entre procesos
+    fcntl = None
+
+def dumps_bytes(obj, sort_keys=False):
+    """Compact UTF-8 JSON; orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"), default=str).encode("utf-8")
+
+def loads_bytes(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps_bytes(content)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Arranca el pool de navegadores al iniciar FastAPI y lo cierra al apagar (no en el perfil "http")
+    if BROWSER_ENABLED:
+        browser_supervisor.start()
+        driver_pool.warm_up()
+    job_queue.start()
+    result_cache.start_sync(float(os.environ.get("SHARED_CACHE_POLL_SECONDS", 1)))
+    if SCHEDULER_ENABLED:
+        scrape_scheduler.start()
+    yield
+    scrape_scheduler.stop()
+    result_cache.stop_sync()
+    job_queue.stop()
+    driver_pool.shutdown()
+    browser_supervisor.stop()
+    snapshot_store.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # CORS Configuration
 app.add_middleware(
@@ -29,76 +127,820 @@ app.add_middleware(
     allow_headers=["*"], # Permite todas las cabeceras
 )
 
+# --- Metrics & Timing ---
+METRIC_HELP = {
+    "scraper_stage_seconds": ("histogram", "Exclusive time spent in each scraper stage."),
+    "scraper_duration_seconds": ("histogram", "End-to-end duration of a scraper run."),
+    "scraper_runs_total": ("counter", "Scraper runs by outcome."),
+    "scraper_fetch_path_total": ("counter", "Scraper runs by fetch path (http, http-304, selenium)."),
+    "cache_requests_total": ("counter", "Result cache lookups by status."),
+    "scheduler_runs_total": ("counter", "Scheduled background refreshes by outcome."),
+    "browser_live": ("gauge", "Browsers (chromedriver + Chrome trees) alive in this worker."),
+    "browser_leased": ("gauge", "Browsers currently leased by a scrape."),
+    "browser_processes": ("gauge", "Processes in the tracked browser trees."),
+    "browser_rss_bytes": ("gauge", "Resident memory of the tracked browser trees."),
+    "browser_launches_total": ("counter", "Browser launches by outcome (ok, error, capped)."),
+    "browser_kills_total": ("counter", "Browser processes killed by the supervisor, by reason."),
+    "browser_ready_seconds": ("histogram", "Seconds until the target nodes of a page settled, by source."),
+    "push_events_total": ("counter", "Odds change events published to the push feed."),
+    "push_dropped_subscribers_total": ("counter", "Push subscribers dropped for falling behind."),
+    "rate_limited_total": ("counter", "API requests rejected with 429 by route."),
+    "upstream_budget_denied_total": ("counter", "Upstream requests held back by the per-host budget."),
+    "http_requests_total": ("counter", "API requests by route and status code."),
+    "http_request_duration_seconds": ("histogram", "API request duration by route."),
+}
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}  # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set(self, name, value, **labels):
+        """Set a gauge (declared as "gauge" in ``METRIC_HELP``)."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters.setdefault(name, {})[key] = float(value)
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ""
+        escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+                   for k, v in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+        for name, series in sorted(counters.items()):
+            kind, help_text = METRIC_HELP.get(name, ("counter", name))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{self._labels(k)} {v:g}" for k, v in sorted(series.items())]
+        for name, series in sorted(histograms.items()):
+            kind, help_text = METRIC_HELP.get(name, ("histogram", name))
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for k, state in sorted(series.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{name}_bucket{self._labels(k + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{self._labels(k + (('le', '+Inf'),))} {state[-1]}")
+                lines.append(f"{name}_sum{self._labels(k)} {state[-2]:.6f}")
+                lines.append(f"{name}_count{self._labels(k)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+
+# Estado por hilo: scraper en curso, pila de spans abiertos y spans terminados
+_timing_state = threading.local()
+last_scrape_timings = {}  # scraper -> [(stage, seconds)] del último scrape
+
+@contextmanager
+def timed(stage, scraper=None):
+    """Time a stage of the current scraper; nested spans are subtracted (exclusive time)."""
+    stack = _timing_state.__dict__.setdefault("stack", [])
+    span = {"stage": stage, "children": 0.0, "seconds": 0.0}
+    stack.append(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        if stack:
+            stack[-1]["children"] += elapsed
+        span["seconds"] = elapsed - span["children"]
+        metrics.observe("scraper_stage_seconds", span["seconds"],
+                        scraper=scraper or getattr(_timing_state, "scraper", None) or "none", stage=stage)
+        if (spans := getattr(_timing_state, "spans", None)) is not None:
+            spans.append((stage, span["seconds"]))
+
+def instrumented_scraper(name):
+    """Decorator: label spans inside the scraper with ``name`` and record run metrics."""
+    def decorate(scrape_fn):
+        @functools.wraps(scrape_fn)
+        def wrapper(*args, **kwargs):
+            previous = (getattr(_timing_state, "scraper", None), getattr(_timing_state, "spans", None))
+            _timing_state.scraper, _timing_state.spans = name, []
+            outcome, started = "exception", time.perf_counter()
+            try:
+                data = scrape_fn(*args, **kwargs)
+                outcome = "error" if is_error_result(data) else "ok"
+                if isinstance(data, dict) and data.get("fetched_via"):
+                    metrics.inc("scraper_fetch_path_total", scraper=name, via=data["fetched_via"])
+                return data
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics.observe("scraper_duration_seconds", elapsed, scraper=name)
+                metrics.inc("scraper_runs_total", scraper=name, outcome=outcome)
+                last_scrape_timings[name] = _timing_state.spans + [("total", elapsed)]
+                _timing_state.scraper, _timing_state.spans = previous
+        return wrapper
+    return decorate
+
+def server_timing_value(spans):
+    """Render ``[(stage, seconds)]`` as a Server-Timing header value, summing repeated stages."""
+    totals = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - started, route=path)
+    metrics.inc("http_requests_total", route=path, status=response.status_code)
+    return response
+
+# --- Backends opcionales (plugins que se importan la primera vez que se usan) ---
+# Perfil "http": sin navegador (ni Selenium ni Chromium en la imagen); solo sirven los scrapers que
+# resuelven por HTTP. Perfil "full": HTTP primero y Chrome como respaldo.
+DEPLOYMENT_PROFILE = os.environ.get("DEPLOYMENT_PROFILE", "full").lower()
+BROWSER_ENABLED = DEPLOYMENT_PROFILE != "http"
+
+def _load_selenium():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    # webdriver.Chrome también es perezoso en Selenium 4: se resuelve aquí, no en el primer lanzamiento
+    return types.SimpleNamespace(webdriver=webdriver, Chrome=webdriver.Chrome, Options=Options, Service=Service)
+
+def _load_arrow():
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow
+
+BACKEND_LOADERS = {"selenium": _load_selenium, "arrow": _load_arrow}
+backend_load_times = {}  # backend -> segundos que tardó en importarse (None si no está instalado)
+
+@functools.lru_cache(maxsize=None)
+def load_backend(name):
+    """Import the optional backend ``name`` on first use; ``None`` if it is not installed."""
+    started = time.perf_counter()
+    try:
+        backend = BACKEND_LOADERS[name]()
+    except ImportError as e:
+        backend_load_times[name] = None
+        logger.warning(f"Backend '{name}' no disponible: {e}")
+        return None
+    backend_load_times[name] = time.perf_counter() - started
+    logger.info(f"Backend '{name}' cargado en {backend_load_times[name] * 1000:.0f} ms.")
+    return backend
+
 # --- Helper Functions ---
 def init_driver():
     """Initialize Chrome WebDriver in headless mode with improved error handling"""
-    chrome_options = Options()
+    if not BROWSER_ENABLED or not (selenium := load_backend("selenium")):
+        return None
+    chrome_options = selenium.Options()
     chrome_options.add_argument('--headless')
     chrome_options.add_argument('--no-sandbox')
     chrome_options.add_argument('--disable-dev-shm-usage')
     chrome_options.add_argument('--disable-gpu')
     chrome_options.add_argument('--window-size=1920x1080')
     chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-    
-    # Optimización opcional: Deshabilitar imágenes si no son necesarias para el scraping
-    # chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    # "eager": driver.get() vuelve con el DOM listo, sin esperar imágenes ni iframes
+    chrome_options.page_load_strategy = os.environ.get("DRIVER_PAGE_LOAD_STRATEGY", "eager")
+    # Las imágenes, fuentes, CSS y trackers se bloquean por scraper (ver DRIVER_PROFILES)
 
     chrome_binary_path = os.environ.get("GOOGLE_CHROME_BIN")
     chromedriver_path = os.environ.get("CHROMEDRIVER_PATH")
 
     if chrome_binary_path:
         chrome_options.binary_location = chrome_binary_path
-        print(f"Usando Chrome binary de: {chrome_binary_path}")
+        logger.info(f"Usando Chrome binary de: {chrome_binary_path}")
     else:
-        print("ADVERTENCIA: GOOGLE_CHROME_BIN no está configurado. Selenium intentará usar la ubicación por defecto de Chrome.")
+        logger.warning("ADVERTENCIA: GOOGLE_CHROME_BIN no está configurado. Selenium intentará usar la ubicación por defecto de Chrome.")
 
     try:
         if chromedriver_path:
-            print(f"Usando ChromeDriver de: {chromedriver_path}")
-            service = Service(executable_path=chromedriver_path)
-            driver = webdriver.Chrome(service=service, options=chrome_options)
+            logger.info(f"Usando ChromeDriver de: {chromedriver_path}")
+            service = selenium.Service(executable_path=chromedriver_path)
+            driver = selenium.Chrome(service=service, options=chrome_options)
         else:
-            print("ADVERTENCIA: CHROMEDRIVER_PATH no está configurado. Selenium intentará encontrar ChromeDriver en el PATH del sistema.")
-            driver = webdriver.Chrome(options=chrome_options) # Requiere chromedriver en el PATH
+            logger.warning("ADVERTENCIA: CHROMEDRIVER_PATH no está configurado. Selenium intentará encontrar ChromeDriver en el PATH del sistema.")
+            driver = selenium.Chrome(options=chrome_options) # Requiere chromedriver en el PATH
         
-        print("WebDriver inicializado correctamente.")
+        logger.info("WebDriver inicializado correctamente.")
         return driver
     except Exception as e:
-        print(f"Error FATAL al inicializar ChromeDriver: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error FATAL al inicializar ChromeDriver: {str(e)}")
         # Proveer más detalles sobre errores comunes de inicialización
         if "cannot find chrome binary" in str(e).lower():
-            print("Detalle del error: No se encuentra el binario de Chrome. Verifica la variable GOOGLE_CHROME_BIN o la instalación de Chrome.")
+            logger.error("Detalle del error: No se encuentra el binario de Chrome. Verifica la variable GOOGLE_CHROME_BIN o la instalación de Chrome.")
         elif "executable needs to be in PATH" in str(e).lower():
-            print("Detalle del error: ChromeDriver no se encuentra en el PATH. Verifica la variable CHROMEDRIVER_PATH o la ubicación de chromedriver.")
+            logger.error("Detalle del error: ChromeDriver no se encuentra en el PATH. Verifica la variable CHROMEDRIVER_PATH o la ubicación de chromedriver.")
         elif "session not created" in str(e).lower():
-            print("Detalle del error: No se pudo crear la sesión. Puede ser por incompatibilidad de versiones Chrome/ChromeDriver o problemas de recursos.")
+            logger.error("Detalle del error: No se pudo crear la sesión. Puede ser por incompatibilidad de versiones Chrome/ChromeDriver o problemas de recursos.")
         return None
 
+# --- Resource Blocking Profiles ---
+RESOURCE_PATTERNS = {
+    "images": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*", "*.ogg*"],
+    "fonts": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "stylesheets": ["*.css*"],
+}
+# Dominios de anuncios y trackers de terceros que cargan Transfermarkt y Relevo
+THIRD_PARTY_DENYLIST = [
+    "doubleclick.net", "googlesyndication.com", "googletagservices.com", "googletagmanager.com",
+    "google-analytics.com", "adservice.google.com", "amazon-adsystem.com", "adnxs.com", "criteo.com",
+    "criteo.net", "taboola.com", "outbrain.com", "facebook.net", "connect.facebook.net", "scorecardresearch.com",
+    "chartbeat.com", "chartbeat.net", "hotjar.com", "quantserve.com", "rubiconproject.com", "pubmatic.com",
+    "smartadserver.com", "teads.tv", "seedtag.com", "onesignal.com",
+] + [d.strip() for d in os.environ.get("DRIVER_BLOCKED_DOMAINS", "").split(",") if d.strip()]
+DRIVER_ALLOWED_DOMAINS = [d.strip() for d in os.environ.get("DRIVER_ALLOWED_DOMAINS", "").split(",") if d.strip()]
+DRIVER_BLOCKING = os.environ.get("DRIVER_BLOCKING", "true").lower() == "true"
+
+# "block": categorías de RESOURCE_PATTERNS; "third_party": aplicar THIRD_PARTY_DENYLIST;
+# "allow": dominios que nunca se bloquean aunque estén en la denylist.
+DRIVER_PROFILES = {
+    "default": {"block": ["images", "media", "fonts"], "third_party": True, "allow": []},
+    "relevo_news": {"block": ["images", "media", "fonts", "stylesheets"], "third_party": True, "allow": []},
+    "transfermarkt_general": {"block": ["images", "media", "fonts", "stylesheets"], "third_party": True, "allow": []},
+}
+# liga_odds usa el perfil por defecto (sin bloquear "stylesheets", para no romper la maqueta del widget de
+# cuotas); es una copia para que DRIVER_BLOCK_LIGA_ODDS no cambie también el perfil por defecto
+DRIVER_PROFILES["liga_odds"] = copy.deepcopy(DRIVER_PROFILES["default"])
+for _name, _profile in DRIVER_PROFILES.items():
+    # Permite sobrescribir las categorías por scraper, p. ej. DRIVER_BLOCK_LIGA_ODDS=images,media
+    if (_override := os.environ.get(f"DRIVER_BLOCK_{_name.upper()}")) is not None:
+        _profile["block"] = [c.strip() for c in _override.split(",") if c.strip() in RESOURCE_PATTERNS]
+
+def blocked_url_patterns(profile_name):
+    """URL patterns for CDP ``Network.setBlockedURLs`` under the given profile."""
+    profile = DRIVER_PROFILES.get(profile_name) or DRIVER_PROFILES["default"]
+    patterns = [p for category in profile["block"] for p in RESOURCE_PATTERNS.get(category, [])]
+    if profile["third_party"]:
+        allowed = profile["allow"] + DRIVER_ALLOWED_DOMAINS
+        patterns += [f"*{domain}*" for domain in THIRD_PARTY_DENYLIST
+                     if not any(a in domain for a in allowed)]
+    return patterns
+
+def apply_resource_profile(driver, profile_name):
+    """Install the blocking profile on a (possibly reused) driver; no-op if CDP is unavailable."""
+    if not DRIVER_BLOCKING:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns(profile_name)})
+    except Exception as e:
+        logger.warning(f"ADVERTENCIA: no se pudo aplicar el perfil de bloqueo '{profile_name}': {e}")
+
+# --- Browser Supervisor (procesos de Chrome/chromedriver) ---
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BROWSER_PROCESS_NAME = re.compile(r"^(chrome|chromium|headless_shell)", re.I)
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def process_table():
+    """``{pid: (ppid, name, state)}`` for every process, from psutil or ``/proc``."""
+    table = {}
+    if psutil is not None:
+        for p in psutil.process_iter(["ppid", "name", "status"]):
+            table[p.pid] = (p.info["ppid"], p.info["name"] or "", "Z" if p.info["status"] == psutil.STATUS_ZOMBIE else "R")
+        return table
+    if not os.path.isdir("/proc"):
+        return table
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read().decode("utf-8", "replace")
+            state, ppid = stat[stat.rindex(")") + 2:].split()[:2]
+            table[int(entry)] = (int(ppid), stat[stat.index("(") + 1:stat.rindex(")")], state)
+        except (OSError, ValueError):
+            continue
+    return table
+
+def process_tree(root_pid, table):
+    """``root_pid`` and all its descendants that are still in ``table``."""
+    children = {}
+    for pid, (ppid, _, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    tree, pending = [], [root_pid] if root_pid in table else []
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(children.get(pid, ()))
+    return tree
+
+def is_automation_process(pid, name):
+    """True for chromedriver and for Chrome started by WebDriver (never a user's own browser)."""
+    if name.lower().startswith("chromedriver"):
+        return True
+    try:
+        if psutil is not None:
+            cmdline = " ".join(psutil.Process(pid).cmdline())
+        else:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+    except Exception:
+        return False
+    return any(flag in cmdline for flag in ("--enable-automation", "--test-type=webdriver", "--headless"))
+
+def process_rss(pid):
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except Exception:
+        return 0
+
+def kill_processes(pids):
+    """SIGKILL ``pids`` and reap the ones that are our own children."""
+    for pid in reversed(pids):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass
+
+class BrowserSupervisor:
+    """Tracks every browser the pool starts and keeps their number and memory bounded.
+
+    Each driver is registered with its chromedriver PID. A watchdog thread walks the
+    process tree below it every ``interval`` seconds:
+    - A tree leased longer than ``scrape_timeout`` is killed, so the hung Selenium
+      call fails and the pool discards the driver.
+    - A tree above ``max_rss_mb`` is killed, leased or not.
+    - Browser processes left behind by a failed ``quit()``, or orphaned under PID 1,
+      are killed.
+    - Zombies are reaped.
+    ``launch`` holds one of ``max_live`` slots for the driver's lifetime. The slots
+    are flock'ed files in ``slot_dir``, so the cap covers every uvicorn worker on
+    the host (without ``fcntl`` it is per process).
+    """
+
+    def __init__(self, max_live=2, scrape_timeout=120, max_rss_mb=1024, interval=5, reap_orphans=True,
+                 quit_timeout=10, slot_dir=None):
+        self.max_live = max(1, max_live)
+        self.scrape_timeout = scrape_timeout
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.interval = interval
+        self.reap_orphans = reap_orphans
+        self.quit_timeout = quit_timeout
+        self.slot_dir = slot_dir
+        self._drivers = {}  # id(driver) -> {"driver", "root_pid", "slot", "leased_at", "label", "pids", "rss"}
+        self._semaphore = threading.BoundedSemaphore(self.max_live)
+        self._lock = threading.Lock()
+        self._launching = 0
+        self._orphan_candidates = set()
+        self._sweep_hooks = []
+        self._stop = threading.Event()
+        self._thread = None
+        if self.slot_dir and fcntl is not None:
+            os.makedirs(self.slot_dir, exist_ok=True)
+
+    # ----- ciclo de vida de cada driver -----
+    def launch(self, timeout=60):
+        """Start a driver inside a free slot; None if no slot frees up in ``timeout`` or Chrome fails."""
+        if (slot := self._acquire_slot(timeout)) is None:
+            logger.warning(f"BrowserSupervisor: límite de {self.max_live} navegador(es) vivo(s) alcanzado.")
+            metrics.inc("browser_launches_total", outcome="capped")
+            return None
+        with self._lock:
+            self._launching += 1
+        try:
+            driver = init_driver()
+        finally:
+            with self._lock:
+                self._launching -= 1
+        if driver is None:
+            self._release_slot(slot)
+            metrics.inc("browser_launches_total", outcome="error")
+            return None
+        root_pid = getattr(getattr(getattr(driver, "service", None), "process", None), "pid", None)
+        with self._lock:
+            self._drivers[id(driver)] = {"driver": driver, "root_pid": root_pid, "slot": slot, "leased_at": None,
+                                         "label": None, "pids": [root_pid] if root_pid else [], "rss": 0}
+        metrics.inc("browser_launches_total", outcome="ok")
+        return driver
+
+    def mark_leased(self, driver, label):
+        if (entry := self._drivers.get(id(driver))):
+            entry["leased_at"], entry["label"] = time.monotonic(), label
+
+    def mark_idle(self, driver):
+        if (entry := self._drivers.get(id(driver))):
+            entry["leased_at"] = entry["label"] = None
+
+    def quit(self, driver):
+        """``driver.quit()`` with a deadline, then kill whatever is left of its process tree."""
+        with self._lock:
+            entry = self._drivers.pop(id(driver), None)
+        table = process_table()
+        pids = process_tree(entry["root_pid"], table) if entry and entry["root_pid"] else []
+        quitter = threading.Thread(target=self._quit_quietly, args=(driver,), name="driver-quit", daemon=True)
+        quitter.start()
+        quitter.join(self.quit_timeout)
+        if (leftover := [pid for pid in pids if pid in process_table()]):
+            logger.warning(f"BrowserSupervisor: quit() dejó {len(leftover)} proceso(s) vivos, se matan.")
+            metrics.inc("browser_kills_total", reason="quit_failed")
+            kill_processes(leftover)
+        if entry:
+            self._release_slot(entry["slot"])
+
+    @staticmethod
+    def _quit_quietly(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"BrowserSupervisor: error al cerrar el driver: {e}")
+
+    # ----- slots (tope global de navegadores) -----
+    def _acquire_slot(self, timeout):
+        deadline = time.monotonic() + timeout
+        if not self.slot_dir or fcntl is None:
+            return "local" if self._semaphore.acquire(timeout=timeout) else None
+        while True:
+            for i in range(self.max_live):
+                f = open(os.path.join(self.slot_dir, f"browser-slot-{i}.lock"), "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except BlockingIOError:
+                    f.close()
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.2)
+
+    def _release_slot(self, slot):
+        if slot == "local":
+            self._semaphore.release()
+        elif slot is not None:
+            slot.close()  # Cerrar el descriptor libera el flock
+
+    # ----- vigilancia -----
+    def start(self):
+        if self._thread or not (psutil is not None or os.path.isdir("/proc")):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="browser-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.exception(f"BrowserSupervisor: error en la vigilancia: {e}")
+
+    def add_sweep_hook(self, hook):
+        """Run ``hook()`` at the end of every watchdog pass (e.g. the pool's idle eviction)."""
+        self._sweep_hooks.append(hook)
+
+    def sweep(self):
+        """One watchdog pass: refresh trees and RSS, enforce limits, reap zombies and orphans."""
+        table = process_table()
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._drivers.values())
+        tracked = set()
+        for entry in entries:
+            entry["pids"] = process_tree(entry["root_pid"], table) if entry["root_pid"] else []
+            entry["rss"] = sum(process_rss(pid) for pid in entry["pids"])
+            tracked.update(entry["pids"])
+            reason = None
+            if entry["leased_at"] is not None and now - entry["leased_at"] > self.scrape_timeout:
+                reason = "timeout"
+            elif self.max_rss and entry["rss"] > self.max_rss:
+                reason = "rss"
+            if reason:
+                logger.warning(f"BrowserSupervisor: se mata el navegador de '{entry['label'] or 'idle'}' ({reason}: "
+                               f"{now - (entry['leased_at'] or now):.0f}s, {entry['rss'] / 1048576:.0f} MiB).")
+                metrics.inc("browser_kills_total", reason=reason)
+                kill_processes(entry["pids"])
+        self._reap_zombies(table)
+        if self.reap_orphans:
+            self._reap_orphans(table, tracked)
+        metrics.set("browser_live", len(entries))
+        metrics.set("browser_leased", sum(e["leased_at"] is not None for e in entries))
+        metrics.set("browser_processes", len(tracked))
+        metrics.set("browser_rss_bytes", sum(e["rss"] for e in entries))
+        for hook in self._sweep_hooks:
+            hook()
+
+    @staticmethod
+    def _reap_zombies(table):
+        me = os.getpid()
+        # Como PID 1 (contenedor) heredamos los huérfanos de Chrome: hay que recoger cualquier hijo
+        for pid, (ppid, _, state) in table.items():
+            if state == "Z" and (ppid == me or me == 1):
+                try:
+                    os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    pass
+
+    def _reap_orphans(self, table, tracked):
+        with self._lock:
+            if self._launching:
+                return  # Un chromedriver recién lanzado aún no está registrado
+        me = os.getpid()
+        candidates = {pid for pid, (ppid, name, state) in table.items()
+                      if state != "Z" and ppid in (1, me) and pid not in tracked and BROWSER_PROCESS_NAME.match(name)
+                      and is_automation_process(pid, name)}
+        # Solo se matan los vistos en dos pasadas seguidas
+        if (orphans := candidates & self._orphan_candidates):
+            logger.warning(f"BrowserSupervisor: {len(orphans)} proceso(s) de navegador huérfano(s), se matan.")
+            metrics.inc("browser_kills_total", amount=len(orphans), reason="orphan")
+            for pid in orphans:
+                kill_processes(process_tree(pid, table))
+        self._orphan_candidates = candidates - orphans
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._drivers.values())
+        return {"max_live": self.max_live, "live": len(entries), "browsers": [
+            {"pid": e["root_pid"], "processes": len(e["pids"]), "rss_mb": round(e["rss"] / 1048576, 1),
+             "leased_by": e["label"], "leased_for": round(now - e["leased_at"], 1) if e["leased_at"] else None}
+            for e in entries]}
+
+# Directorio de los ficheros compartidos entre workers (slots de navegador, caché de resultados, artículos)
+SHARED_CACHE_DIR = os.environ.get("SHARED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "scrapnew"))
+
+browser_supervisor = BrowserSupervisor(
+    max_live=int(os.environ.get("BROWSER_MAX_LIVE", os.environ.get("DRIVER_POOL_SIZE", 2))),
+    scrape_timeout=float(os.environ.get("BROWSER_SCRAPE_TIMEOUT_SECONDS", 120)),
+    max_rss_mb=float(os.environ.get("BROWSER_MAX_RSS_MB", 1024)),
+    interval=float(os.environ.get("BROWSER_WATCHDOG_INTERVAL", 5)),
+    reap_orphans=os.environ.get("BROWSER_REAP_ORPHANS", "true").lower() == "true",
+    slot_dir=SHARED_CACHE_DIR,
+)
+
+# --- WebDriver Pool ---
+class WebDriverPool:
+    """Bounded pool of warm headless Chrome drivers shared by the Selenium scrapers.
+
+    A driver is leased with ``with driver_pool.lease() as driver:``. On return its
+    cookies and extra tabs are cleared; drivers that fail the health check or have
+    been used ``max_uses`` times are quit and replaced lazily. With ``idle_timeout``
+    drivers unused for that long are quit, which frees their supervisor slot for
+    other workers.
+    """
+
+    def __init__(self, size=2, max_uses=50, lease_timeout=60, warm=1, idle_timeout=0):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.lease_timeout = lease_timeout
+        self.warm = min(max(0, warm), self.size)
+        self.idle_timeout = idle_timeout
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = deque()  # (driver, uses, idle_since)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm_up(self):
+        """Pre-start ``warm`` drivers so the first requests skip the cold start."""
+        self._closed = False
+        for _ in range(self.warm - len(self._idle)):
+            with timed("driver_init", scraper="pool"):
+                driver = browser_supervisor.launch(timeout=0)
+            if not driver:
+                break
+            with self._lock:
+                self._idle.append((driver, 0, time.monotonic()))
+        logger.info(f"WebDriverPool: {len(self._idle)} driver(s) precalentado(s), tamaño máximo {self.size}.")
+
+    @contextmanager
+    def lease(self, profile="default"):
+        """Lease a driver with the ``profile`` resource-blocking profile applied.
+
+        Yields None if no driver could be started or the pool is exhausted.
+        """
+        with timed("driver_lease_wait"):
+            acquired = not self._closed and self._slots.acquire(timeout=self.lease_timeout)
+        if not acquired:
+            logger.warning("WebDriverPool: no hay drivers disponibles (pool cerrado o agotado).")
+            yield None
+            return
+        driver, uses = None, 0
+        try:
+            driver, uses = self._checkout()
+            if driver:
+                browser_supervisor.mark_leased(driver, profile)
+                apply_resource_profile(driver, profile)
+            yield driver
+        finally:
+            if driver:
+                browser_supervisor.mark_idle(driver)
+                self._checkin(driver, uses + 1)
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                driver, uses, _ = self._idle.pop()
+            if self._is_healthy(driver):
+                return driver, uses
+            logger.warning("WebDriverPool: driver inactivo no responde, se descarta.")
+            self._quit(driver)
+        with timed("driver_init"):
+            return browser_supervisor.launch(timeout=self.lease_timeout), 0
+
+    def _checkin(self, driver, uses):
+        if self._closed or uses >= self.max_uses or not self._reset(driver):
+            self._quit(driver)
+            return
+        with self._lock:
+            self._idle.append((driver, uses, time.monotonic()))
+
+    def evict_idle(self):
+        """Quit drivers idle for more than ``idle_timeout`` seconds."""
+        if not self.idle_timeout:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            expired = [item for item in self._idle if item[2] < cutoff]
+            self._idle = deque(item for item in self._idle if item[2] >= cutoff)
+        for driver, _, _ in expired:
+            self._quit(driver)
+        if expired:
+            logger.info(f"WebDriverPool: {len(expired)} driver(s) inactivo(s) cerrado(s).")
+
+    @staticmethod
+    def _is_healthy(driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(driver):
+        """Close extra tabs, drop cookies and blank the page so the next lease starts clean."""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"WebDriverPool: fallo al reiniciar el driver, se recicla: {e}")
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        browser_supervisor.quit(driver)
+
+    def shutdown(self):
+        """Quit idle drivers; drivers still leased are quit when they are returned."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for driver, _, _ in idle:
+            self._quit(driver)
+        logger.info(f"WebDriverPool: cerrado ({len(idle)} driver(s) liberado(s)).")
+
+# Número de workers de uvicorn (la misma variable que lee uvicorn para --workers)
+WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+driver_pool = WebDriverPool(
+    size=int(os.environ.get("DRIVER_POOL_SIZE", 2)),
+    max_uses=int(os.environ.get("DRIVER_MAX_USES", 50)),
+    lease_timeout=float(os.environ.get("DRIVER_LEASE_TIMEOUT", 60)),
+    # Con varios workers no se precalienta: cada uno arrancaría su propio Chrome ocioso
+    warm=int(os.environ.get("DRIVER_POOL_WARM", 1 if WEB_CONCURRENCY == 1 else 0)),
+    # y los drivers ociosos se cierran pronto para no acaparar los slots globales de BROWSER_MAX_LIVE
+    idle_timeout=float(os.environ.get("DRIVER_IDLE_TIMEOUT", 0 if WEB_CONCURRENCY == 1 else 30)),
+)
+browser_supervisor.add_sweep_hook(driver_pool.evict_idle)
+
+# --- Normalización de texto (helpers de los bucles de extracción) ---
+# Patrones precompilados y resultados memoizados: las mismas cuotas, fechas y cabeceras
+# se repiten en cada tarjeta, fila y liga de una página, y de un scrape al siguiente.
+NORMALIZE_CACHE_SIZE = int(os.environ.get("NORMALIZE_CACHE_SIZE", 4096))
+ODD_NUMBER = re.compile(r'(\d+\.?\d*)')
+TRAILING_ODD = re.compile(r'(\d+\.\d+)$')
+# Formatos conocidos de cada sitio; lo que no encaje pasa por dateutil como antes
+LIGA_DATE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})\s+(\d{1,2}):(\d{2})')
+ISO_DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?')
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def clean_odd_value(odd_text):
     if not odd_text:
         return "N/A"
-    odd_text = odd_text.strip().replace('\xa0', ' ').replace('\u00a0', ' ')
-    match = re.search(r'(\d+\.?\d*)', odd_text)
+    odd_text = odd_text.strip().replace('\xa0', ' ')
+    match = ODD_NUMBER.search(odd_text)
     return match.group(1) if match else odd_text
 
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def parse_match_date_liga(date_str):
     if not date_str:
         return "N/A"
+    date_part = date_str.split('-')[0].strip()
+    if (m := LIGA_DATE.fullmatch(date_part)):
+        try:
+            day, month, year, hour, minute = map(int, m.groups())
+            return datetime(year, month, day, hour, minute).strftime('%Y-%m-%d %H:%M')
+        except ValueError:
+            pass  # dateutil decide (y registra) qué hacer con la fecha imposible
     try:
-        date_part = date_str.split('-')[0].strip()
         return parse(date_part, dayfirst=True).strftime('%Y-%m-%d %H:%M')
     except Exception as e:
-        print(f"Error parsing date (liga): {date_str} - {str(e)}")
+        logger.debug("Error parsing date (liga): %s - %s", date_str, e)
         return date_str
 
+def _parse_iso(date_str):
+    """``datetime`` for ISO 8601 strings (the fast path), ``None`` for anything else."""
+    if ISO_DATETIME.fullmatch(date_str):
+        try:
+            return datetime.fromisoformat(date_str)
+        except ValueError:
+            return None
+    return None
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def parse_match_date_transfermarkt_general(date_str):
     try:
-        return parse(date_str).strftime('%Y-%m-%d %H:%M')
+        return (_parse_iso(date_str) or parse(date_str)).strftime('%Y-%m-%d %H:%M')
+    except Exception as e:
+        logger.debug("Error parsing date (transfermarkt general): %s - %s", date_str, e)
+        return date_str
+
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def parse_relevo_date(date_str):
+    if not date_str:
+        return "N/A"
+    try:
+        return (_parse_iso(date_str) or parse(date_str)).strftime('%Y-%m-%d %H:%M:%S')
     except Exception as e:
-        print(f"Error parsing date (transfermarkt general): {date_str} - {str(e)}")
+        logger.debug("Error parsing date (relevo): %s - %s", date_str, e)
         return date_str
 
+# Cabeceras de TablesLeague -> nombres de columna normalizados
+TABLE_COLUMN_MAP = {
+    "#": "Position", "POS": "Position", "TEAM": "Team", "CLUB": "Team",
+    "M": "Played", "P": "Played", "PJ": "Played", "PLD": "Played",
+    "W": "Won", "G": "Won", "PG": "Won", "D": "Drawn", "E": "Drawn", "PE": "Drawn",
+    "L": "Lost", "PP": "Lost", # 'P' is ambiguous, might conflict if also for Points
+    "G+": "GoalsFor", "GF": "GoalsFor", "F": "GoalsFor",
+    "G-": "GoalsAgainst", "GA": "GoalsAgainst", "A": "GoalsAgainst",
+    "GD": "GoalDifference", "DG": "GoalDifference", "DIF": "GoalDifference",
+    "PTS": "Points", "PUNTOS": "Points"
+}
+
+def normalize_column_header(text):
+    return TABLE_COLUMN_MAP.get(text.upper(), text)
+
+def intern_text(text):
+    """Share one copy of strings that repeat across rows (team, league and bookmaker names)."""
+    return sys.intern(text) if isinstance(text, str) else text
+
+def normalize_cache_info():
+    """Hit/miss counters of the memoized helpers (for the micro-benchmarks)."""
+    return {fn.__name__: fn.cache_info()._asdict() for fn in (
+        clean_odd_value, parse_match_date_liga, parse_match_date_transfermarkt_general,
+        parse_relevo_date)}
+
 def safe_get_text(element, default="N/A"):
     if element is None:
         return default
@@ -107,416 +949,2070 @@ def safe_get_text(element, default="N/A"):
     except:
         return default
 
-def parse_relevo_date(date_str):
-    if not date_str:
-        return "N/A"
-    try:
-        return parse(date_str).strftime('%Y-%m-%d %H:%M:%S')
-    except Exception as e:
-        print(f"Error parsing date (relevo): {date_str} - {str(e)}")
-        return date_str
+# --- HTML Parsing ---
+def _select_html_parser():
+    """Parser backend for BeautifulSoup: HTML_PARSER env var, lxml by default if installed."""
+    choice = os.environ.get("HTML_PARSER", "lxml")
+    if choice == "lxml" and importlib.util.find_spec("lxml") is None:
+        logger.warning("ADVERTENCIA: lxml no está instalado, se usa 'html.parser'.")
+        return "html.parser"
+    return choice
 
-# --- Scraper 1: La Liga Odds ---
-def scrape_liga_odds():
-    print("Iniciando scrape_liga_odds...")
-    driver = init_driver()
-    if not driver:
-        return {"error": "Failed to initialize browser", "details": "WebDriver could not start. Check logs for init_driver errors."}
-    
-    url = "https://www.transfermarkt.es/apuestas/la-liga/"
-    print(f"Accediendo a Cuotas La Liga: {url}")
+HTML_PARSER = _select_html_parser()
+
+# Subárbol que necesita cada extractor; el resto de la página no se llega a construir.
+# scrape_liga_odds navega hermanos y padres por todo el artículo, así que se parsea completo.
+def _has_class(class_name):
+    # Regex en vez de cadena: SoupStrainer compara la cadena contra el atributo class completo
+    return re.compile(r'(?:^|\s)' + re.escape(class_name) + r'(?:\s|$)')
+
+PARSE_SCOPES = {
+    "relevo_news": SoupStrainer("div", class_=_has_class("grid--AB-C")),
+    "tables_liga": SoupStrainer("div", class_=_has_class("content")),
+    "transfermarkt_general": SoupStrainer("div", class_=_has_class("card__item-container")),
+}
+
+def make_soup(markup, scope=None, parser=None):
+    """Build a BeautifulSoup tree, limited to ``PARSE_SCOPES[scope]`` when a scope is given."""
+    with timed("parse"):
+        return BeautifulSoup(markup, parser or HTML_PARSER, parse_only=PARSE_SCOPES.get(scope))
+
+# --- Fetch Layer (HTTP primero, Selenium como respaldo) ---
+class BrowserUnavailable(Exception):
+    """Raised when a page needs the browser but no WebDriver could be leased."""
+
+class ReadinessTimeout(Exception):
+    """Raised when the nodes a page is waited on never appeared."""
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
+}
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 15))
+HTTP_FAST_PATH = os.environ.get("HTTP_FAST_PATH", "true").lower() == "true"
+# Orígenes de cada fuente; se pueden apuntar a un servidor local (benchmarks/standin_server.py)
+TRANSFERMARKT_BASE_URL = os.environ.get("TRANSFERMARKT_BASE_URL", "https://www.transfermarkt.es").rstrip("/")
+RELEVO_BASE_URL = os.environ.get("RELEVO_BASE_URL", "https://www.relevo.com").rstrip("/")
+TABLESLEAGUE_URL = os.environ.get("TABLESLEAGUE_URL", "https://m.tablesleague.com/")
+
+def make_http_session(pool_size=int(os.environ.get("HTTP_POOL_SIZE", 10))):
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+http_session = make_http_session()
+
+def class_marker(class_name):
+    """Regex that finds an element carrying ``class_name`` in raw HTML."""
+    return re.compile(r'class=["\'][^"\']*\b' + re.escape(class_name) + r'\b')
+
+# Mismas señales que espera BROWSER_READINESS, comprobadas sobre el HTML estático
+LIGA_ODDS_MARKER = class_marker("oddscomp-widget-iframe-container")
+GENERAL_ODDS_MARKER = class_marker("card__item-container")
+RELEVO_MARKER = re.compile(r'grid--AB-C[\s\S]*?<article\b[^>]*class=["\'][^"\']*\barticle\b')
+
+# Validadores HTTP por URL y la extracción que produjo esa versión de la página
+_conditional_cache = {}  # url -> {"etag", "last_modified", "extracted"}
+_conditional_lock = threading.Lock()
+
+def conditional_get(url, extract, accept=None, timeout=HTTP_TIMEOUT):
+    """GET ``url`` with ``If-None-Match``/``If-Modified-Since`` from the previous response.
+
+    Returns ``(extracted, response)``. On a 304 the extraction stored for the last 200 is
+    returned without downloading or parsing the page again. ``extracted`` is None when
+    the response is not OK or ``accept(response)`` rejects it.
+    """
+    with _conditional_lock:
+        entry = _conditional_cache.get(url)
+    headers = {}
+    if entry:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+    response = http_session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and entry:
+        return copy.deepcopy(entry["extracted"]), response
+    if not response.ok or (accept and not accept(response)):
+        return None, response
+    extracted = extract(response)
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    if (etag or last_modified) and not is_error_result(extracted):
+        with _conditional_lock:
+            _conditional_cache[url] = {"etag": etag, "last_modified": last_modified,
+                                       "extracted": copy.deepcopy(extracted)}
+    return extracted, response
+
+def timed_extract(extract, markup):
+    with timed("extract"):
+        return extract(markup)
+
+# --- Rate Limiting & Upstream Budget ---
+class TokenBucket:
+    """``rate`` tokens per second up to ``burst``; not thread-safe on its own."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+
+    def take(self, amount=1.0):
+        """Take ``amount`` tokens; returns 0 on success or the seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+class KeyedBuckets:
+    """One ``TokenBucket`` per key, created on demand; the least recently used are dropped past ``max_keys``.
+
+    Rates are per worker: with ``WEB_CONCURRENCY`` workers each gets an equal share
+    of ``per_minute`` and ``burst``, so the limits hold for the whole service.
+    """
+
+    def __init__(self, per_minute, burst, max_keys=10000):
+        self.rate = per_minute / 60 / WEB_CONCURRENCY
+        self.burst = max(1.0, burst / WEB_CONCURRENCY)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, amount=1.0):
+        with self._lock:
+            if (bucket := self._buckets.get(key)) is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(amount)
+
+    def tokens(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+        return round(bucket.tokens, 2) if bucket else self.burst
+
+# Límites de la API por cliente y ruta. Las rutas que pueden lanzar un scrape tienen un límite
+# más estricto y además un tope por ruta para todos los clientes juntos.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_EXEMPT = {p.strip() for p in os.environ.get("RATE_LIMIT_EXEMPT", "/metrics").split(",") if p.strip()}
+SCRAPE_ROUTE_PREFIXES = ("/raspar", "/exportar/", "/v2/start-scraping-task")
+# Detrás de un proxy (Railway) la IP del cliente llega en X-Forwarded-For
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+class RateLimiter:
+    """Token buckets per (client, route), plus one per route for the scraping routes."""
+
+    def __init__(self, scrape_per_minute, scrape_burst, default_per_minute, default_burst,
+                 route_per_minute, route_burst, exempt=()):
+        self.scrape_clients = KeyedBuckets(scrape_per_minute, scrape_burst)
+        self.default_clients = KeyedBuckets(default_per_minute, default_burst)
+        self.scrape_routes = KeyedBuckets(route_per_minute, route_burst)
+        self.exempt = set(exempt)
+
+    def check(self, client, route):
+        """0 if the request may proceed, else the seconds the client should wait."""
+        if route in self.exempt:
+            return 0.0
+        if not route.startswith(SCRAPE_ROUTE_PREFIXES):
+            return self.default_clients.take((client, route))
+        return self.scrape_clients.take((client, route)) or self.scrape_routes.take(route)
+
+rate_limiter = RateLimiter(
+    scrape_per_minute=float(os.environ.get("RATE_LIMIT_SCRAPE_PER_MINUTE", 30)),
+    scrape_burst=float(os.environ.get("RATE_LIMIT_SCRAPE_BURST", 10)),
+    default_per_minute=float(os.environ.get("RATE_LIMIT_DEFAULT_PER_MINUTE", 120)),
+    default_burst=float(os.environ.get("RATE_LIMIT_DEFAULT_BURST", 60)),
+    route_per_minute=float(os.environ.get("RATE_LIMIT_ROUTE_PER_MINUTE", 300)),
+    route_burst=float(os.environ.get("RATE_LIMIT_ROUTE_BURST", 100)),
+    exempt=RATE_LIMIT_EXEMPT,
+)
+
+def client_id(request):
+    if TRUST_PROXY_HEADERS and (forwarded := request.headers.get("x-forwarded-for")):
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def match_route(scope):
+    return next((route for route in app.router.routes if route.matches(scope)[0] == Match.FULL), None)
+
+@app.middleware("http")
+async def enforce_rate_limits(request, call_next):
+    if not RATE_LIMIT_ENABLED or not (route := match_route(request.scope)):
+        return await call_next(request)
+    if (retry_after := rate_limiter.check(client_id(request), route.path)):
+        # Este middleware va por fuera del de métricas: la respuesta 429 se cuenta aquí
+        metrics.inc("rate_limited_total", route=route.path)
+        metrics.inc("http_requests_total", route=route.path, status=429)
+        return FastJSONResponse(content={"error": "Too Many Requests", "retry_after": math.ceil(retry_after)},
+                                status_code=429, headers={"Retry-After": str(math.ceil(retry_after))})
+    return await call_next(request)
+
+# Presupuesto de peticiones a cada sitio, compartido por todos los scrapers (y el modo profundo)
+class UpstreamBudgetExhausted(Exception):
+    """Raised instead of scraping when the target host has no budget left."""
+
+    def __init__(self, key, host, retry_after):
+        super().__init__(f"Presupuesto de peticiones a {host} agotado ('{key}'); reintentar en {retry_after:.0f}s")
+        self.key, self.host, self.retry_after = key, host, retry_after
+
+UPSTREAM_BUDGET_ERROR = "Upstream budget exhausted"
+
+class UpstreamBudget:
+    """Requests per minute each upstream host may receive, whichever scraper sends them."""
+
+    def __init__(self, per_minute, burst):
+        self.per_minute, self.burst = per_minute, burst
+        self._buckets = KeyedBuckets(per_minute, burst, max_keys=1000)
+        self._hosts = set()
+
+    def take(self, host, amount=1.0):
+        """0 if ``host`` may be requested now, else the seconds until it may."""
+        self._hosts.add(host)
+        if (retry_after := self._buckets.take(host, amount)):
+            metrics.inc("upstream_budget_denied_total", host=host)
+        return retry_after
+
+    def admit(self, key):
+        """``ResultCache`` admission hook: raise ``UpstreamBudgetExhausted`` if scraping ``key`` is over budget."""
+        # Los compuestos no piden nada por sí mismos: sus partes pasan por aquí (o por take) una a una
+        if key in COMPOSITE_SCRAPERS or not (host := upstream_host(key)):
+            return
+        if (retry_after := self.take(host)):
+            raise UpstreamBudgetExhausted(key, host, retry_after)
+
+    def status(self):
+        return {"per_minute": self.per_minute, "burst": self.burst,
+                "hosts": {host: {"tokens": self._buckets.tokens(host)} for host in sorted(self._hosts)}}
+
+def upstream_host(key):
+    origin = {"liga_odds": TRANSFERMARKT_BASE_URL, "transfermarkt_general": TRANSFERMARKT_BASE_URL,
+              "relevo_news": RELEVO_BASE_URL, "tables_liga": TABLESLEAGUE_URL}.get(key.partition(":")[0])
+    return urllib.parse.urlsplit(origin).netloc if origin else None
+
+def budget_exhausted_result(e):
+    return {"error": UPSTREAM_BUDGET_ERROR, "details": str(e), "retry_after": math.ceil(e.retry_after)}
+
+UPSTREAM_BUDGET_ENABLED = os.environ.get("UPSTREAM_BUDGET_ENABLED", "true").lower() == "true"
+upstream_budget = UpstreamBudget(
+    per_minute=float(os.environ.get("UPSTREAM_BUDGET_PER_MINUTE", 20)),
+    burst=float(os.environ.get("UPSTREAM_BUDGET_BURST", 30)),
+)
+
+# --- Readiness (espera adaptativa en el navegador) ---
+# "wait_for": nodos que indican que la página ya tiene el contenido; "extract": contenedores cuyo
+# outerHTML se devuelve a Python (el primer selector que exista); "timeout": techo en segundos.
+BROWSER_READINESS = {
+    "liga_odds": {"wait_for": ".oddscomp-widget-iframe-container", "extract": ["main", "body"], "timeout": 20},
+    "relevo_news": {"wait_for": "div.grid--AB-C article.article", "extract": ["div.grid--AB-C"], "timeout": 25},
+    "transfermarkt_general": {"wait_for": ".card__item-container", "extract": [".card__item-container"], "timeout": 20},
+}
+READINESS_SETTLE_SECONDS = float(os.environ.get("READINESS_SETTLE_SECONDS", 0.5))
+READINESS_POLL_SECONDS = float(os.environ.get("READINESS_POLL_SECONDS", 0.1))
+
+# Firma barata de los nodos objetivo: nº de nodos, descendientes y longitud de texto (null si no hay)
+READINESS_SIGNATURE_JS = """
+const nodes = document.querySelectorAll(arguments[0]);
+if (!nodes.length) return null;
+let descendants = 0, text = 0;
+for (const node of nodes) { descendants += node.getElementsByTagName('*').length; text += node.textContent.length; }
+return nodes.length + ':' + descendants + ':' + text;
+"""
+# outerHTML del primer selector con coincidencias, sin repetir nodos anidados dentro de otro elegido
+CONTAINER_HTML_JS = """
+for (const selector of arguments[0]) {
+  const nodes = Array.from(document.querySelectorAll(selector));
+  if (!nodes.length) continue;
+  return nodes.filter(n => !nodes.some(o => o !== n && o.contains(n))).map(n => n.outerHTML).join('\\n');
+}
+return null;
+"""
+
+def wait_until_stable(driver, selector, timeout, settle=READINESS_SETTLE_SECONDS, poll=READINESS_POLL_SECONDS):
+    """Poll until the nodes matching ``selector`` exist and stop changing for ``settle`` seconds.
+
+    Returns the seconds waited. At the deadline, nodes that exist but are still changing are
+    accepted as they are; if nothing matched, ``ReadinessTimeout`` is raised.
+    """
+    started = time.monotonic()
+    deadline, last, since = started + timeout, None, None
+    while True:
+        signature = driver.execute_script(READINESS_SIGNATURE_JS, selector)
+        now = time.monotonic()
+        if signature is None or signature != last:
+            last, since = signature, now
+        elif now - since >= settle:
+            return now - started
+        if now >= deadline:
+            if last is None:
+                raise ReadinessTimeout(f"'{selector}' no apareció en {timeout:.1f}s")
+            logger.debug(f"'{selector}' sigue cambiando tras {timeout:.1f}s; se usa tal cual.")
+            return now - started
+        time.sleep(poll)
+
+def container_html(driver, selectors):
+    """outerHTML of the first of ``selectors`` present in the page; the full ``page_source`` otherwise."""
+    return driver.execute_script(CONTAINER_HTML_JS, selectors) or driver.page_source
+
+class AdaptiveTimeouts:
+    """Per-source wait timeouts learned from the p95 of recent ready times.
+
+    Until ``min_samples`` observations exist the configured ceiling is used; afterwards the
+    timeout is ``p95 * headroom`` clamped to ``[floor, ceiling]``. A timeout is recorded as
+    the ceiling, so a site that became slower pushes its learned timeout back up.
+    """
+
+    def __init__(self, headroom=1.5, floor=3.0, window=50, min_samples=10):
+        self.headroom, self.floor, self.window, self.min_samples = headroom, floor, window, min_samples
+        self._samples = {}  # fuente -> deque de segundos hasta estar lista
+        self._lock = threading.Lock()
+
+    def p95(self, source):
+        with self._lock:
+            samples = sorted(self._samples.get(source, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def timeout_for(self, source, ceiling):
+        if (p95 := self.p95(source)) is None:
+            return ceiling
+        return min(ceiling, max(self.floor, p95 * self.headroom))
+
+    def record(self, source, seconds):
+        with self._lock:
+            self._samples.setdefault(source, deque(maxlen=self.window)).append(seconds)
+        metrics.observe("browser_ready_seconds", seconds, source=source)
+
+    def status(self):
+        with self._lock:
+            sources = {source: len(samples) for source, samples in self._samples.items()}
+        return {source: {"samples": count, "p95": self.p95(source),
+                         "timeout": self.timeout_for(source, BROWSER_READINESS.get(source, {}).get("timeout", 20))}
+                for source, count in sources.items()}
+
+adaptive_timeouts = AdaptiveTimeouts(
+    headroom=float(os.environ.get("READINESS_HEADROOM", 1.5)),
+    floor=float(os.environ.get("READINESS_MIN_TIMEOUT", 3)),
+    window=int(os.environ.get("READINESS_WINDOW", 50)),
+    min_samples=int(os.environ.get("READINESS_MIN_SAMPLES", 10)),
+)
+
+# Tope de renders de Chrome simultáneos (además del tamaño del pool); solo se toma en el respaldo Selenium
+browser_scrape_slots = threading.BoundedSemaphore(int(os.environ.get("BROWSER_SCRAPE_CONCURRENCY", 2)))
+
+def fetch_page(url, marker, extract, label, profile="default"):
+    """Fetch ``url`` and run ``extract(html)`` on it; returns ``(extracted, via)``.
+
+    The page is first requested through the pooled HTTP session (as a conditional GET);
+    if the response contains ``marker`` it is extracted directly (via ``"http"``, or
+    ``"http-304"`` when the previous extraction is reused). Otherwise, holding one of the
+    ``browser_scrape_slots``, a driver is leased from the pool (with the ``profile``
+    blocking profile), the page is rendered until the
+    ``BROWSER_READINESS[profile]`` nodes settle and only the target container's HTML is
+    extracted (via ``"selenium"``).
+    """
+    if HTTP_FAST_PATH:
+        try:
+            with timed("http_fetch"):
+                extracted, response = conditional_get(url, lambda r: timed_extract(extract, r.text),
+                                                      accept=lambda r: marker.search(r.text))
+            if extracted is not None:
+                via = "http-304" if response.status_code == 304 else "http"
+                logger.info(f"{label}: servido por {via} ({len(response.content)} bytes)")
+                return extracted, via
+            logger.warning(f"{label}: HTTP {response.status_code} sin el contenido esperado, escalando a Selenium.")
+        except requests.exceptions.RequestException as e_http:
+            logger.warning(f"{label}: fallo HTTP ({e_http}), escalando a Selenium.")
+
+    if not BROWSER_ENABLED:
+        raise BrowserUnavailable(f"Browser scrapers are disabled in this deployment (DEPLOYMENT_PROFILE={DEPLOYMENT_PROFILE}).")
+    with browser_scrape_slots, driver_pool.lease(profile) as driver:
+        if not driver:
+            raise BrowserUnavailable("WebDriver could not start. Check logs for init_driver errors.")
+        readiness = BROWSER_READINESS[profile]
+        timeout = adaptive_timeouts.timeout_for(profile, readiness["timeout"])
+        with timed("driver_get"):
+            driver.get(url)
+        try:
+            with timed("dom_ready"):
+                adaptive_timeouts.record(profile, wait_until_stable(driver, readiness["wait_for"], timeout))
+        except ReadinessTimeout:
+            adaptive_timeouts.record(profile, readiness["timeout"])
+            raise
+        with timed("container_html"):
+            html = container_html(driver, readiness["extract"])
+    return timed_extract(extract, html), "selenium"
+
+# --- Scraper 1: League Odds (páginas de apuestas de Transfermarkt, una por liga) ---
+# Todas comparten la maqueta de /apuestas/la-liga/; la clave de caché de LaLiga se mantiene "liga_odds"
+LEAGUES = {
+    "la-liga": {"name": "LaLiga", "path": "/apuestas/la-liga/"},
+    "premier-league": {"name": "Premier League", "path": "/apuestas/premier-league/"},
+    "serie-a": {"name": "Serie A", "path": "/apuestas/serie-a/"},
+    "bundesliga": {"name": "Bundesliga", "path": "/apuestas/bundesliga/"},
+    "ligue-1": {"name": "Ligue 1", "path": "/apuestas/ligue-1/"},
+    "champions-league": {"name": "Champions League", "path": "/apuestas/champions-league/"},
+}
+
+def league_cache_key(slug):
+    return "liga_odds" if slug == "la-liga" else f"liga_odds:{slug}"
+
+HEADING_TAGS = ("h2", "h3", "h4")
+COMBINED_BET_HEADING = re.compile(r"apuesta combinada", re.I)
+TITLE_ODDS_HEADING = re.compile(r"favoritos para ganar", re.I)
+ODD_VALUE = re.compile(r"\d+(?:[.,]\d+)?")
+
+def parse_combined_bet_leg(tag):
+    """``{"match", "bet", "odd"}`` for a leg written as "<match>: <bet> <strong>odd</strong>", else None.
+
+    Detected by shape (a colon and a trailing bold decimal odd), not by team names, so
+    it works for any league.
+    """
+    odd_tag = next((s for s in reversed(tag.find_all("strong")) if ODD_VALUE.fullmatch(safe_get_text(s, ""))), None)
+    text = tag.get_text(" ", strip=True)
+    if odd_tag is None or ":" not in text:
+        return None
+    match_part, _, bet_part = text.partition(":")
+    odd_text = safe_get_text(odd_tag)
+    bet_part = bet_part.strip()
+    if bet_part.endswith(odd_text):
+        bet_part = bet_part[:-len(odd_text)].strip()
+    if not match_part.strip():
+        return None
+    return {"match": match_part.strip(), "bet": bet_part or "N/A", "odd": clean_odd_value(odd_text.replace(",", "."))}
+
+def extract_liga_odds(html, parser=None):
+    result = {"matches": [], "title_odds": [], "combined_bet": {}}
+    soup = make_soup(html, parser=parser)
+
+    if (combined_bet_section := soup.find(HEADING_TAGS, string=COMBINED_BET_HEADING)):
+        combined_bet_data = {"description": "", "bets": []}
+        desc_paragraphs = []
+        # Párrafos hasta el siguiente encabezado: las patas tienen forma "partido: apuesta cuota"
+        for elem in combined_bet_section.find_next_siblings():
+            if elem.name in HEADING_TAGS:
+                break
+            for p_tag in ([elem] if elem.name in ("p", "li") else elem.find_all(["p", "li"])):
+                if (leg := parse_combined_bet_leg(p_tag)):
+                    combined_bet_data["bets"].append(leg)
+                elif (text := safe_get_text(p_tag, "")):
+                    desc_paragraphs.append(text)
+        combined_bet_data["description"] = " ".join(desc_paragraphs)
+        result["combined_bet"] = combined_bet_data
+    else:
+        logger.warning("Cuotas liga: Sección 'Apuesta combinada' no encontrada.")
+
+    match_table_figure = soup.find('figure', class_='wp-block-table')
+    if match_table_figure and (table := match_table_figure.find('table')):
+        for row in table.find_all('tr')[1:]:
+            try:
+                cols = row.find_all('td')
+                if len(cols) >= 4:
+                    prediction_text = safe_get_text(cols[3])
+                    prediction_parts = prediction_text.split('➡')
+                    match_data = {
+                        "teams": safe_get_text(cols[0]),
+                        "date": parse_match_date_liga(safe_get_text(cols[1])),
+                        "stadium": safe_get_text(cols[2]),
+                        "prediction": prediction_parts[0].strip() if prediction_parts else "N/A",
+                        "odd": clean_odd_value(prediction_parts[-1].strip()) if len(prediction_parts) > 1 else "N/A"
+                    }
+                    result["matches"].append(match_data)
+            except Exception as e_row:
+                logger.warning(f"Error procesando fila de partido de liga: {e_row}")
+    else:
+        logger.warning("Cuotas liga: Tabla de partidos no encontrada.")
+
+    # Solo encabezados: buscar el texto en cualquier etiqueta coincidía con <html> y devolvía la primera tabla
+    title_section = soup.find(HEADING_TAGS, string=TITLE_ODDS_HEADING)
+    if title_section and (title_table_figure := title_section.find_next('figure', class_='wp-block-table')) and \
+       (table := title_table_figure.find('table')):
+        headers = [safe_get_text(th) for th in table.find('thead').find_all('th')] if table.find('thead') else []
+        tbody_rows = table.find('tbody').find_all('tr') if table.find('tbody') else table.find_all('tr')[1:]
+        for row in tbody_rows:
+            cols = row.find_all('td')
+            if cols:
+                team_data = {"team": safe_get_text(cols[0])}
+                for i, header in enumerate(headers[1:], 1): # Start from second header
+                    if i < len(cols):
+                        team_data[header] = clean_odd_value(safe_get_text(cols[i]))
+                    else: # Fallback if less cols than headers
+                        team_data[header] = "N/A"
+                if not headers and len(cols) > 1: # No headers, generic bookmaker names
+                     for i in range(1, len(cols)):
+                        team_data[f"Bookmaker_{i}"] = clean_odd_value(safe_get_text(cols[i]))
+                result["title_odds"].append(team_data)
+    else:
+        logger.warning("Cuotas liga: Sección/tabla de favoritos para ganar la liga no encontrada.")
+    return result
+
+def scrape_league_odds(slug):
+    league = LEAGUES[slug]
+    logger.debug(f"Iniciando scrape de cuotas {league['name']}...")
+    url = f"{TRANSFERMARKT_BASE_URL}{league['path']}"
+    logger.debug(f"Accediendo a Cuotas {league['name']}: {url}")
     result = {
         "scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "league": slug,
         "matches": [],
         "title_odds": [],
         "combined_bet": {}
     }
-    
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "oddscomp-widget-iframe-container"))
-        )
-        print("Cuotas La Liga: Contenido principal cargado")
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        
-        combined_bet_section = soup.find('h2', string='Apuesta combinada de la jornada')
-        if combined_bet_section:
-            combined_bet_data = {"description": "", "bets": []}
-            desc_paragraphs = []
-            next_elem = combined_bet_section.find_next_sibling('p')
-            while next_elem and next_elem.name == 'p':
-                desc_paragraphs.append(safe_get_text(next_elem))
-                next_elem = next_elem.find_next_sibling()
-            combined_bet_data["description"] = " ".join(desc_paragraphs)
-            
-            bet_container = combined_bet_section.find_parent()
-            if bet_container:
-                potential_bets_p = bet_container.find_all('p')
-                parsed_bets_count = 0
-                for p_tag in potential_bets_p:
-                    if parsed_bets_count >= 3: break
-                    p_text = safe_get_text(p_tag)
-                    if ':' in p_text and any(kw in p_text for kw in ['Girona', 'Atlético', 'Barcelona', 'Real Madrid', 'vs']):
-                        strong_tag = p_tag.find('strong') or p_tag.find_next('strong')
-                        odd_value = clean_odd_value(safe_get_text(strong_tag)) if strong_tag else "N/A"
-                        parts = p_text.split(':', 1)
-                        match_part = parts[0].strip()
-                        bet_part = parts[1].split(odd_value)[0].strip() if len(parts) > 1 and odd_value != "N/A" else (parts[1].strip() if len(parts) > 1 else "N/A")
-                        combined_bet_data["bets"].append({"match": match_part, "bet": bet_part, "odd": odd_value})
-                        parsed_bets_count += 1
-            result["combined_bet"] = combined_bet_data
-        else:
-            print("Cuotas La Liga: Sección 'Apuesta combinada de la jornada' no encontrada.")
 
-        match_table_figure = soup.find('figure', class_='wp-block-table')
-        if match_table_figure and (table := match_table_figure.find('table')):
-            for row in table.find_all('tr')[1:]:
-                try:
-                    cols = row.find_all('td')
-                    if len(cols) >= 4:
-                        prediction_text = safe_get_text(cols[3])
-                        prediction_parts = prediction_text.split('➡')
-                        match_data = {
-                            "teams": safe_get_text(cols[0]),
-                            "date": parse_match_date_liga(safe_get_text(cols[1])),
-                            "stadium": safe_get_text(cols[2]),
-                            "prediction": prediction_parts[0].strip() if prediction_parts else "N/A",
-                            "odd": clean_odd_value(prediction_parts[-1].strip()) if len(prediction_parts) > 1 else "N/A"
-                        }
-                        result["matches"].append(match_data)
-                except Exception as e_row:
-                    print(f"Error procesando fila de partido La Liga: {e_row}")
-        else:
-            print("Cuotas La Liga: Tabla de partidos no encontrada.")
-            
-        title_section = soup.find(lambda tag: tag.name and "Favoritos para ganar la liga española" in tag.get_text())
-        if title_section and (title_table_figure := title_section.find_next('figure', class_='wp-block-table')) and \
-           (table := title_table_figure.find('table')):
-            headers = [safe_get_text(th) for th in table.find('thead').find_all('th')] if table.find('thead') else []
-            tbody_rows = table.find('tbody').find_all('tr') if table.find('tbody') else table.find_all('tr')[1:]
-            for row in tbody_rows:
-                cols = row.find_all('td')
-                if cols:
-                    team_data = {"team": safe_get_text(cols[0])}
-                    for i, header in enumerate(headers[1:], 1): # Start from second header
-                        if i < len(cols):
-                            team_data[header] = clean_odd_value(safe_get_text(cols[i]))
-                        else: # Fallback if less cols than headers
-                            team_data[header] = "N/A"
-                    if not headers and len(cols) > 1: # No headers, generic bookmaker names
-                         for i in range(1, len(cols)):
-                            team_data[f"Bookmaker_{i}"] = clean_odd_value(safe_get_text(cols[i]))
-                    result["title_odds"].append(team_data)
-        else:
-            print("Cuotas La Liga: Sección/tabla de favoritos para ganar la liga no encontrada.")
-            
+    try:
+        extracted, result["fetched_via"] = fetch_page(
+            url, LIGA_ODDS_MARKER, extract_liga_odds,
+            f"Cuotas {league['name']}", profile="liga_odds")
+        logger.debug(f"Cuotas {league['name']}: Contenido principal cargado")
+        result.update(extracted)
+    except BrowserUnavailable as e:
+        return {"error": "Failed to initialize browser", "details": str(e)}
     except Exception as e:
-        print(f"Error durante el scraping de cuotas de La Liga: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error durante el scraping de cuotas de {league['name']}: {str(e)}")
         result["error_scraping"] = f"Error during scraping process: {str(e)}"
-    finally:
-        if driver:
-            driver.quit()
-            print("Cuotas La Liga: WebDriver cerrado.")
-    print(f"scrape_liga_odds finalizado. Partidos: {len(result.get('matches',[]))}, Cuotas Título: {len(result.get('title_odds',[]))}")
+    logger.info(f"Cuotas {league['name']} finalizado. Partidos: {len(result.get('matches',[]))}, Cuotas Título: {len(result.get('title_odds',[]))}")
     return result
 
+def _league_scraper(slug):
+    def scrape():
+        return scrape_league_odds(slug)
+    scrape.__name__ = "scrape_liga_odds" if slug == "la-liga" else f"scrape_league_odds_{slug.replace('-', '_')}"
+    return instrumented_scraper(league_cache_key(slug))(scrape)
+
+LEAGUE_SCRAPERS = {slug: _league_scraper(slug) for slug in LEAGUES}
+scrape_liga_odds = LEAGUE_SCRAPERS["la-liga"]
+
 # --- Scraper 2: Relevo News ---
-def scrape_relevo_news():
-    print("Iniciando scrape_relevo_news...")
-    driver = init_driver()
-    if not driver:
-        return {"error": "Failed to initialize browser", "details": "WebDriver could not start."}
-    
-    url = "https://www.relevo.com/futbol/mercado-fichajes/"
-    print(f"Accediendo a Noticias Relevo: {url}")
-    result = {"scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "articles": []}
-    
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 25).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.grid--AB-C article.article"))
-        )
-        print("Noticias Relevo: Contenido principal cargado")
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        articles_html = soup.select("div.grid--AB-C div.grid__col article.article")
-        
-        if not articles_html:
-            print("Noticias Relevo: No se encontraron artículos.")
-            result["info"] = "No articles found on Relevo at this time."
-            return result
+def extract_relevo_news(html, parser=None, scoped=True):
+    result = {"articles": []}
+    soup = make_soup(html, "relevo_news" if scoped else None, parser)
+    articles_html = soup.select("div.grid--AB-C div.grid__col article.article")
 
-        for article_tag in articles_html:
-            try:
-                title, link = "N/A", "N/A"
-                if (title_anchor := (article_tag.find('h2', class_='article__title') or article_tag.find('h3', class_='article__title')) \
-                                  and (article_tag.find('h2', class_='article__title') or article_tag.find('h3', class_='article__title')).find('a')):
-                    title = safe_get_text(title_anchor)
-                    link_href = title_anchor.get('href', "N/A")
-                    link = "https://www.relevo.com" + link_href if link_href and not link_href.startswith('http') else link_href
-
-                authors_list = []
-                if (author_section := article_tag.find('div', class_='author--art')):
-                    if (author_signature := author_section.find('p', class_='author__signature')):
-                        author_tags_a = author_signature.find_all('a')
-                        if author_tags_a:
-                            for author_a in author_tags_a:
-                                name = safe_get_text(author_a)
-                                url_ = author_a.get('href', "N/A")
-                                profile_url = "https://www.relevo.com" + url_ if url_ and not url_.startswith('http') else url_
-                                authors_list.append({"name": name, "profile_url": profile_url})
-                        else: # No <a> tags, try to get text
-                            author_name_candidate = safe_get_text(author_signature).split("Hace")[0].strip()
-                            if author_name_candidate: authors_list.append({"name": author_name_candidate, "profile_url": "N/A"})
-                    if not authors_list: # Fallback: find any author links in section
-                        for author_link_tag in author_section.find_all('a', href=re.compile(r'/autor/')):
-                            name = safe_get_text(author_link_tag)
-                            url_ = author_link_tag.get('href')
+    if not articles_html:
+        logger.warning("Noticias Relevo: No se encontraron artículos.")
+        result["info"] = "No articles found on Relevo at this time."
+        return result
+
+    for article_tag in articles_html:
+        try:
+            title, link = "N/A", "N/A"
+            if (title_anchor := (article_tag.find('h2', class_='article__title') or article_tag.find('h3', class_='article__title')) \
+                              and (article_tag.find('h2', class_='article__title') or article_tag.find('h3', class_='article__title')).find('a')):
+                title = safe_get_text(title_anchor)
+                link_href = title_anchor.get('href', "N/A")
+                link = "https://www.relevo.com" + link_href if link_href and not link_href.startswith('http') else link_href
+
+            authors_list = []
+            if (author_section := article_tag.find('div', class_='author--art')):
+                if (author_signature := author_section.find('p', class_='author__signature')):
+                    author_tags_a = author_signature.find_all('a')
+                    if author_tags_a:
+                        for author_a in author_tags_a:
+                            name = safe_get_text(author_a)
+                            url_ = author_a.get('href', "N/A")
                             profile_url = "https://www.relevo.com" + url_ if url_ and not url_.startswith('http') else url_
                             authors_list.append({"name": name, "profile_url": profile_url})
-                
-                publication_date_str = "N/A"
-                date_tag = article_tag.find('time', class_='author__date') or article_tag.find('time')
-                if date_tag:
-                    publication_date_str = date_tag.get('datetime', safe_get_text(date_tag))
-                publication_date = parse_relevo_date(publication_date_str)
-
-                image_url = "N/A"
-                if (img_container := article_tag.find('div', class_='article__container-img')) and \
-                   (img_tag := img_container.find('img')):
-                    image_url = img_tag.get('src', img_tag.get('data-src', "N/A"))
-
-                result["articles"].append({
-                    "title": title, "link": link,
-                    "authors": authors_list if authors_list else [{"name": "N/A", "profile_url": "N/A"}],
-                    "publication_date_iso": publication_date if publication_date != "N/A" else publication_date_str,
-                    "image_url": image_url
-                })
-            except Exception as e_article:
-                print(f"Error procesando artículo de Relevo: {e_article}")
+                    else: # No <a> tags, try to get text
+                        author_name_candidate = safe_get_text(author_signature).split("Hace")[0].strip()
+                        if author_name_candidate: authors_list.append({"name": author_name_candidate, "profile_url": "N/A"})
+                if not authors_list: # Fallback: find any author links in section
+                    for author_link_tag in author_section.find_all('a', href=re.compile(r'/autor/')):
+                        name = safe_get_text(author_link_tag)
+                        url_ = author_link_tag.get('href')
+                        profile_url = "https://www.relevo.com" + url_ if url_ and not url_.startswith('http') else url_
+                        authors_list.append({"name": name, "profile_url": profile_url})
+
+            publication_date_str = "N/A"
+            date_tag = article_tag.find('time', class_='author__date') or article_tag.find('time')
+            if date_tag:
+                publication_date_str = date_tag.get('datetime', safe_get_text(date_tag))
+            publication_date = parse_relevo_date(publication_date_str)
+
+            image_url = "N/A"
+            if (img_container := article_tag.find('div', class_='article__container-img')) and \
+               (img_tag := img_container.find('img')):
+                image_url = img_tag.get('src', img_tag.get('data-src', "N/A"))
+
+            result["articles"].append({
+                "title": title, "link": link,
+                "authors": authors_list if authors_list else [{"name": "N/A", "profile_url": "N/A"}],
+                "publication_date_iso": publication_date if publication_date != "N/A" else publication_date_str,
+                "image_url": image_url
+            })
+        except Exception as e_article:
+            logger.warning(f"Error procesando artículo de Relevo: {e_article}")
+    return result
+
+@instrumented_scraper("relevo_news")
+def scrape_relevo_news():
+    logger.debug("Iniciando scrape_relevo_news...")
+    url = f"{RELEVO_BASE_URL}/futbol/mercado-fichajes/"
+    logger.debug(f"Accediendo a Noticias Relevo: {url}")
+    result = {"scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "articles": []}
+
+    try:
+        extracted, result["fetched_via"] = fetch_page(
+            url, RELEVO_MARKER, extract_relevo_news,
+            "Noticias Relevo", profile="relevo_news")
+        logger.debug("Noticias Relevo: Contenido principal cargado")
+        result.update(extracted)
+    except BrowserUnavailable as e:
+        return {"error": "Failed to initialize browser", "details": str(e)}
     except Exception as e:
-        print(f"Error durante el scraping de Relevo: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error durante el scraping de Relevo: {str(e)}")
         result["error_scraping"] = f"Error during Relevo scraping: {str(e)}"
-    finally:
-        if driver:
-            driver.quit()
-            print("Noticias Relevo: WebDriver cerrado.")
-    print(f"scrape_relevo_news finalizado. Artículos: {len(result.get('articles',[]))}")
+    logger.info(f"scrape_relevo_news finalizado. Artículos: {len(result.get('articles',[]))}")
+    return result
+
+# --- Relevo: detalle de artículos (modo profundo) ---
+# Los artículos se piden por HTTP en paralelo (nunca en el navegador) y se guardan por URL:
+# en cada scrape del listado solo se descargan los artículos nuevos.
+RELEVO_DEEP_KEY = "relevo_news:deep"
+ARTICLE_BODY_SELECTORS = ["div.article__body", "div.article-body", "div.ue-c-article__body"]
+ARTICLE_TAG_SELECTORS = ["ul.article__tags a", "div.article__tags a", "ul.tags a", "a[rel=tag]"]
+# Bloques dentro del cuerpo que no son texto del artículo
+ARTICLE_NOISE = "aside, figure, script, style, .ad, .related"
+NEWS_ARTICLE_TYPES = {"NewsArticle", "Article", "ReportageNewsArticle", "AnalysisNewsArticle"}
+
+def _json_ld_article(soup):
+    """The ``NewsArticle`` object of the page's JSON-LD, or an empty dict."""
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = loads_bytes(str(script.string or ""))  # orjson no acepta subclases de str
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get("@graph", [data]) if isinstance(data, dict) else []
+        for item in items:
+            types = item.get("@type") if isinstance(item, dict) else None
+            if set(types if isinstance(types, list) else [types]) & NEWS_ARTICLE_TYPES:
+                return item
+    return {}
+
+def extract_relevo_article(html, parser=None):
+    """Body text and tags of one Relevo article page (DOM first, JSON-LD as fallback)."""
+    soup = make_soup(html, None, parser)
+    json_ld = _json_ld_article(soup)
+
+    body = ""
+    if (container := next((c for s in ARTICLE_BODY_SELECTORS if (c := soup.select_one(s))), None)):
+        for noise in container.select(ARTICLE_NOISE):
+            noise.decompose()
+        body = "\n\n".join(text for p in container.find_all("p") if (text := " ".join(p.get_text().split())))
+    body = body or (json_ld.get("articleBody") or "").strip()
+
+    tags = [safe_get_text(a, "") for s in ARTICLE_TAG_SELECTORS for a in soup.select(s)]
+    tags += [meta.get("content", "") for meta in soup.find_all("meta", property="article:tag")]
+    if isinstance(keywords := json_ld.get("keywords"), str):
+        keywords = keywords.split(",")
+    tags += [k for k in keywords or [] if isinstance(k, str)]
+    # Sin duplicados (ignorando mayúsculas) y en el orden en que aparecen
+    unique_tags = {}
+    for tag in (t.strip() for t in tags):
+        if tag:
+            unique_tags.setdefault(tag.casefold(), intern_text(tag))
+
+    section = (soup.find("meta", property="article:section") or {}).get("content") or json_ld.get("articleSection")
+    return {"body": body or "N/A", "tags": list(unique_tags.values()),
+            "section": intern_text(section) if isinstance(section, str) else "N/A"}
+
+class HostLimiter:
+    """At most ``limit`` concurrent requests per host."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        with semaphore:
+            yield
+
+class ArticleCache:
+    """Parsed article details by URL: an in-memory LRU backed by an SQLite file.
+
+    Memory keeps the ``max_entries`` most recently used articles; the file (if
+    ``path`` is set) keeps up to ``disk_max_entries`` and survives restarts, so a new
+    worker only downloads articles nobody has parsed yet. Both drop the least
+    recently used entries first.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS articles (
+            url TEXT PRIMARY KEY, data BLOB NOT NULL, fetched_at REAL NOT NULL, used_at REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_articles_used ON articles (used_at);
+    """
+
+    def __init__(self, path=None, max_entries=500, disk_max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self._entries = OrderedDict()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def _remember(self, url, data):
+        with self._lock:
+            self._entries[url] = data
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, url):
+        with self._lock:
+            if (data := self._entries.get(url)) is not None:
+                self._entries.move_to_end(url)
+                return data
+        if not self.path:
+            return None
+        try:
+            with self._disk_lock:
+                conn = self._connection()
+                row = conn.execute("SELECT data FROM articles WHERE url = ?", (url,)).fetchone()
+                if row:
+                    # Solo se toca used_at al pasar a memoria, no en cada acierto
+                    with conn:
+                        conn.execute("UPDATE articles SET used_at = ? WHERE url = ?", (time.time(), url))
+        except sqlite3.Error as e:
+            logger.warning(f"ArticleCache: lectura de '{url}' fallida: {e}")
+            return None
+        if not row:
+            return None
+        data = loads_bytes(row[0])
+        self._remember(url, data)
+        return data
+
+    def put(self, url, data):
+        self._remember(url, data)
+        if not self.path:
+            return
+        now = time.time()
+        try:
+            with self._disk_lock, self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO articles (url, data, fetched_at, used_at) VALUES (?, ?, ?, ?)",
+                             (url, dumps_bytes(data), now, now))
+                conn.execute("DELETE FROM articles WHERE url IN (SELECT url FROM articles ORDER BY used_at DESC "
+                             "LIMIT -1 OFFSET ?)", (self.disk_max_entries,))
+        except sqlite3.Error as e:
+            logger.warning(f"ArticleCache: escritura de '{url}' fallida: {e}")
+
+    def status(self):
+        with self._lock:
+            memory = len(self._entries)
+        return {"memory": memory, "max_entries": self.max_entries, "path": self.path}
+
+ARTICLE_HOST_CONCURRENCY = int(os.environ.get("ARTICLE_HOST_CONCURRENCY", 4))
+article_host_limiter = HostLimiter(ARTICLE_HOST_CONCURRENCY)
+article_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("ARTICLE_FETCH_WORKERS", 8)),
+                                      thread_name_prefix="article")
+article_cache = ArticleCache(
+    path=os.environ.get("ARTICLE_CACHE_PATH", os.path.join(SHARED_CACHE_DIR, "relevo_articles.db")) or None,
+    max_entries=int(os.environ.get("ARTICLE_CACHE_SIZE", 500)),
+    disk_max_entries=int(os.environ.get("ARTICLE_CACHE_DISK_SIZE", 5000)),
+)
+
+def relevo_fetch_url(link):
+    """``link`` on the configured RELEVO_BASE_URL (the listing always links to www.relevo.com)."""
+    return RELEVO_BASE_URL + link[len("https://www.relevo.com"):] if link.startswith("https://www.relevo.com") else link
+
+def fetch_relevo_article(link):
+    with article_host_limiter.slot(link), timed("article_fetch", scraper=RELEVO_DEEP_KEY):
+        response = http_session.get(relevo_fetch_url(link), timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    with timed("article_extract", scraper=RELEVO_DEEP_KEY):
+        return extract_relevo_article(response.content)
+
+def enrich_relevo_articles(articles):
+    """``(articles, deferred)``: the listing articles with ``body``, ``tags`` and ``section`` added.
+
+    Only uncached links are fetched; ``deferred`` counts those left for a later scrape because
+    the upstream budget was spent.
+    """
+    links = list(dict.fromkeys(a["link"] for a in articles if a.get("link", "N/A").startswith("http")))
+    details = {link: detail for link in links if (detail := article_cache.get(link)) is not None}
+    futures, failed, deferred = {}, 0, 0
+    for link in (link for link in links if link not in details):
+        if UPSTREAM_BUDGET_ENABLED and (retry_after := upstream_budget.take(urllib.parse.urlsplit(relevo_fetch_url(link)).netloc)):
+            # Sin caché: se descargará en un scrape posterior (el resultado parcial caduca antes)
+            deferred += 1
+            details[link] = {"detail_error": f"{UPSTREAM_BUDGET_ERROR} (reintentar en {retry_after:.0f}s)"}
+            continue
+        futures[link] = article_executor.submit(fetch_relevo_article, link)
+    for link, future in futures.items():
+        try:
+            article_cache.put(link, details.setdefault(link, future.result()))
+        except Exception as e:
+            failed += 1
+            details[link] = {"detail_error": str(e)}
+            logger.warning(f"Noticias Relevo (detalle): fallo en {link}: {e}")
+    logger.info(f"Noticias Relevo (detalle): {len(links) - len(futures) - deferred} en caché, "
+                f"{len(futures) - failed} descargados, {failed} fallidos, {deferred} aplazados por presupuesto.")
+    return [{**article, **details.get(article.get("link"), {})} for article in articles], deferred
+
+@instrumented_scraper(RELEVO_DEEP_KEY)
+def scrape_relevo_news_deep():
+    """Relevo listing (through the result cache) plus every article's body and tags.
+
+    If some articles were deferred by the upstream budget the result is marked ``partial``,
+    so ``result_cache`` keeps it only for ``partial_ttl`` and the next scrape fetches them.
+    """
+    listing, _ = result_cache.get("relevo_news", scrape_relevo_news)
+    if is_error_result(listing):
+        return listing
+    with timed("article_details"):
+        articles, deferred = enrich_relevo_articles(listing.get("articles", []))
+    result = {**listing, "articles": articles}
+    if deferred:
+        result.update(partial=True, deferred_articles=deferred)
     return result
 
 # --- Scraper 3: TablesLeague Data ---
+def extract_tablesleague_data(html, parser=None, scoped=True):
+    result = {"leagues": []}
+    soup = make_soup(html, "tables_liga" if scoped else None, parser)
+
+    if not (content_div := soup.find('div', class_='content')):
+        result["error"] = "No se encontró 'div.content' en TablesLeague."
+        return result
+
+    league_headers = [h for h in content_div.find_all('div', class_='header') if h.find('img', class_='flag')]
+    if not league_headers:
+        result["info"] = "No se encontraron cabeceras de liga con banderas en TablesLeague."
+        return result
+
+    for league_header_tag in league_headers:
+        league_name = "Unknown League"
+        if (img_tag := league_header_tag.find('img', class_='flag')) and \
+           img_tag.next_sibling and isinstance(img_tag.next_sibling, str):
+            league_name = img_tag.next_sibling.strip()
+        elif (a_tag := league_header_tag.find('a')):
+            league_name = safe_get_text(a_tag)
+        else: # Fallback
+            full_header_text = league_header_tag.get_text(separator=" ", strip=True)
+            img_alt = img_tag.get('alt', '') if img_tag else ''
+            league_name = full_header_text.replace(img_alt, '').strip() or "League Name Not Found"
+
+        league_data = {"name": league_name, "teams": []}
+        if not (table_div := league_header_tag.find_next_sibling('div', class_='table')):
+            logger.warning(f"TablesLeague WARN: No 'div.table' para liga '{league_name}'.")
+            continue
+
+        rows = table_div.find_all('div', class_='row')
+        if len(rows) <= 1: # Need more than just a header row potentially
+            logger.warning(f"TablesLeague WARN: No filas de datos para liga '{league_name}'.")
+            continue
+
+        column_headers_tags = table_div.find('div', class_='row headers')
+        final_headers = [normalize_column_header(safe_get_text(cell))
+                         for cell in column_headers_tags.find_all('div', class_='cell')] if column_headers_tags else []
+
+        for row_tag in rows:
+            if 'headers' in row_tag.get('class', []): continue
+            cells = row_tag.find_all('div', class_='cell')
+            if not cells: continue
+
+            team_stats = {}
+            for i, cell_tag in enumerate(cells):
+                header_name = final_headers[i] if i < len(final_headers) and final_headers[i] else f"column_{i+1}"
+                text = safe_get_text(cell_tag)
+                team_stats[header_name] = intern_text(text) if header_name == "Team" else text
+
+            if team_stats.get("Team"):
+                league_data["teams"].append(team_stats)
+
+        if league_data["teams"]: result["leagues"].append(league_data)
+    return result
+
+@instrumented_scraper("tables_liga")
 def scrape_tablesleague_data():
-    url = "https://m.tablesleague.com/"
-    print(f"Accediendo a TablesLeague: {url}")
+    url = TABLESLEAGUE_URL
+    logger.debug(f"Accediendo a TablesLeague: {url}")
     result = {"scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "leagues": []}
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=20)
+        with timed("http_fetch"):
+            extracted, response = conditional_get(
+                url, lambda r: timed_extract(extract_tablesleague_data, r.content), timeout=20)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        if not (content_div := soup.find('div', class_='content')):
-            result["error"] = "No se encontró 'div.content' en TablesLeague."
-            return result
-
-        league_headers = [h for h in content_div.find_all('div', class_='header') if h.find('img', class_='flag')]
-        if not league_headers:
-            result["info"] = "No se encontraron cabeceras de liga con banderas en TablesLeague."
-            return result
-
-        for league_header_tag in league_headers:
-            league_name = "Unknown League"
-            if (img_tag := league_header_tag.find('img', class_='flag')) and \
-               img_tag.next_sibling and isinstance(img_tag.next_sibling, str):
-                league_name = img_tag.next_sibling.strip()
-            elif (a_tag := league_header_tag.find('a')):
-                league_name = safe_get_text(a_tag)
-            else: # Fallback
-                full_header_text = league_header_tag.get_text(separator=" ", strip=True)
-                img_alt = img_tag.get('alt', '') if img_tag else ''
-                league_name = full_header_text.replace(img_alt, '').strip() or "League Name Not Found"
-            
-            league_data = {"name": league_name, "teams": []}
-            if not (table_div := league_header_tag.find_next_sibling('div', class_='table')):
-                print(f"TablesLeague WARN: No 'div.table' para liga '{league_name}'.")
-                continue
-            
-            rows = table_div.find_all('div', class_='row')
-            if len(rows) <= 1: # Need more than just a header row potentially
-                print(f"TablesLeague WARN: No filas de datos para liga '{league_name}'.")
-                continue
-
-            column_map = {
-                "#": "Position", "POS": "Position", "TEAM": "Team", "CLUB": "Team",
-                "M": "Played", "P": "Played", "PJ": "Played", "PLD": "Played",
-                "W": "Won", "G": "Won", "PG": "Won", "D": "Drawn", "E": "Drawn", "PE": "Drawn",
-                "L": "Lost", "PP": "Lost", # 'P' is ambiguous, might conflict if also for Points
-                "G+": "GoalsFor", "GF": "GoalsFor", "F": "GoalsFor",
-                "G-": "GoalsAgainst", "GA": "GoalsAgainst", "A": "GoalsAgainst",
-                "GD": "GoalDifference", "DG": "GoalDifference", "DIF": "GoalDifference",
-                "PTS": "Points", "PUNTOS": "Points"
-            }
-            column_headers_tags = table_div.find('div', class_='row headers')
-            final_headers = [column_map.get(safe_get_text(cell).upper(), safe_get_text(cell)) 
-                             for cell in column_headers_tags.find_all('div', class_='cell')] if column_headers_tags else []
-
-            for row_tag in rows:
-                if 'headers' in row_tag.get('class', []): continue
-                cells = row_tag.find_all('div', class_='cell')
-                if not cells: continue
-                
-                team_stats = {}
-                for i, cell_tag in enumerate(cells):
-                    header_name = final_headers[i] if i < len(final_headers) and final_headers[i] else f"column_{i+1}"
-                    team_stats[header_name] = safe_get_text(cell_tag)
-                
-                if team_stats.get("Team"):
-                    league_data["teams"].append(team_stats)
-            
-            if league_data["teams"]: result["leagues"].append(league_data)
-        
+        result.update(extracted)
+        result["fetched_via"] = "http-304" if response.status_code == 304 else "http"
     except requests.exceptions.RequestException as e_http:
         result["error"] = f"Fallo HTTP en TablesLeague: {e_http}"
     except Exception as e_general:
         result["error"] = f"Error inesperado en TablesLeague: {e_general}"
-        print(traceback.format_exc())
+        logger.exception(f"Error inesperado en TablesLeague: {e_general}")
     
     if not result["leagues"] and "error" not in result and "info" not in result:
         result["info"] = "Scraping de TablesLeague completado, no se encontraron datos de ligas procesables."
-    print(f"scrape_tablesleague_data finalizado. Ligas: {len(result.get('leagues', []))}")
+    logger.info(f"scrape_tablesleague_data finalizado. Ligas: {len(result.get('leagues', []))}")
     return result
 
 # --- Scraper 4: Transfermarkt General Odds ---
+def extract_transfermarkt_general_odds(html, parser=None, scoped=True):
+    result = {"matches": []}
+    soup = make_soup(html, "transfermarkt_general" if scoped else None, parser)
+    match_cards = soup.find_all('div', class_='card__item-container')
+
+    if not match_cards:
+        result["info"] = "No se encontraron tarjetas de partidos generales en Transfermarkt."
+        return result
+
+    for card in match_cards:
+        try:
+            match_name = safe_get_text(card.find('div', class_='card__bonus-name'), "Unknown Match")
+            league, home_team, away_team, bet_type, odd_value = "N/A", "N/A", "N/A", "N/A", "N/A"
+
+            parts = match_name.split(' - ')
+            if len(parts) >= 2:
+                odd_value = parts[-1]
+                main_info = ' - '.join(parts[:-1])
+                bet_type_parts = main_info.rsplit(' - ', 1) # rsplit to get bet_type if present
+                if len(bet_type_parts) > 1 and len(bet_type_parts[-1]) < 50: # Heuristic
+                    bet_type = bet_type_parts[-1].strip()
+                    match_info_str = bet_type_parts[0].strip()
+                else:
+                    bet_type = "Resultado del partido" # Default
+                    match_info_str = main_info.strip()
+
+                league_teams_parts = match_info_str.split(':', 1)
+                if len(league_teams_parts) > 1:
+                    league = league_teams_parts[0].strip()
+                    teams_str = league_teams_parts[1].strip()
+                else:
+                    league = "General" # Default if no league prefix
+                    teams_str = match_info_str.strip()
+
+                teams = [t.strip() for t in teams_str.split('vs')]
+                if len(teams) == 2: home_team, away_team = teams[0], teams[1]
+                elif len(teams) == 1: home_team = teams[0]
+            else: # Fallback if parsing ' - ' fails
+                if (num_match := TRAILING_ODD.search(match_name)):
+                    odd_value = num_match.group(1)
+                # Could add more robust parsing here if needed
+                bet_type = match_name # Use full name as bet_type if cannot parse
+
+            bookmaker_name, bookmaker_logo = "N/A", "N/A"
+            if (bookmaker_img := card.find('img', class_='card__logo')):
+                bookmaker_name = bookmaker_img.get('alt', safe_get_text(bookmaker_img)).strip()
+                bookmaker_logo = bookmaker_img.get('src', "N/A")
+
+            expiry_time_str = "N/A"
+            if (expiry_tag := card.find('div', class_='countdown')) and expiry_tag.has_attr('data-valid-until'):
+                 expiry_time_str = expiry_tag['data-valid-until']
+
+            offer_link = "N/A"
+            if (offer_link_tag := card.find('a', class_='card__button')) and offer_link_tag.has_attr('href'):
+                offer_link = offer_link_tag['href']
+                if offer_link.startswith('/'): offer_link = "https://www.transfermarkt.es" + offer_link
+
+            result["matches"].append({
+                "league": intern_text(league), "homeTeam": intern_text(home_team), "awayTeam": intern_text(away_team),
+                "betType": bet_type, "odd": clean_odd_value(odd_value),
+                "bookmaker": {"name": intern_text(bookmaker_name), "logo": bookmaker_logo},
+                "expiryTime": expiry_time_str, "offerLink": offer_link
+            })
+        except Exception as e_card:
+            logger.warning(f"Error procesando tarjeta general Transfermarkt: {e_card}")
+    return result
+
+@instrumented_scraper("transfermarkt_general")
 def scrape_transfermarkt_general_odds():
-    print("Iniciando scrape_transfermarkt_general_odds...")
-    driver = init_driver()
-    if not driver:
-        return {"error": "Failed to initialize browser", "details": "WebDriver could not start."}
-    
-    url = "https://www.transfermarkt.es/apuestas/cuotas/"
-    print(f"Accediendo a Cuotas Generales Transfermarkt: {url}")
+    logger.debug("Iniciando scrape_transfermarkt_general_odds...")
+    url = f"{TRANSFERMARKT_BASE_URL}/apuestas/cuotas/"
+    logger.debug(f"Accediendo a Cuotas Generales Transfermarkt: {url}")
     result = {"scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "matches": []}
-    
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_all_elements_located((By.CLASS_NAME, "card__item-container"))
-        )
-        print("Cuotas Generales Transfermarkt: Contenido cargado")
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        match_cards = soup.find_all('div', class_='card__item-container')
-        
-        if not match_cards:
-            result["info"] = "No se encontraron tarjetas de partidos generales en Transfermarkt."
-            return result
 
-        for card in match_cards:
-            try:
-                match_name = safe_get_text(card.find('div', class_='card__bonus-name'), "Unknown Match")
-                league, home_team, away_team, bet_type, odd_value = "N/A", "N/A", "N/A", "N/A", "N/A"
-
-                parts = match_name.split(' - ')
-                if len(parts) >= 2:
-                    odd_value = parts[-1]
-                    main_info = ' - '.join(parts[:-1])
-                    bet_type_parts = main_info.rsplit(' - ', 1) # rsplit to get bet_type if present
-                    if len(bet_type_parts) > 1 and len(bet_type_parts[-1]) < 50: # Heuristic
-                        bet_type = bet_type_parts[-1].strip()
-                        match_info_str = bet_type_parts[0].strip()
-                    else:
-                        bet_type = "Resultado del partido" # Default
-                        match_info_str = main_info.strip()
-
-                    league_teams_parts = match_info_str.split(':', 1)
-                    if len(league_teams_parts) > 1:
-                        league = league_teams_parts[0].strip()
-                        teams_str = league_teams_parts[1].strip()
-                    else:
-                        league = "General" # Default if no league prefix
-                        teams_str = match_info_str.strip()
-                    
-                    teams = [t.strip() for t in teams_str.split('vs')]
-                    if len(teams) == 2: home_team, away_team = teams[0], teams[1]
-                    elif len(teams) == 1: home_team = teams[0]
-                else: # Fallback if parsing ' - ' fails
-                    if (num_match := re.search(r'(\d+\.\d+)$', match_name)):
-                        odd_value = num_match.group(1)
-                    # Could add more robust parsing here if needed
-                    bet_type = match_name # Use full name as bet_type if cannot parse
-
-                bookmaker_name, bookmaker_logo = "N/A", "N/A"
-                if (bookmaker_img := card.find('img', class_='card__logo')):
-                    bookmaker_name = bookmaker_img.get('alt', safe_get_text(bookmaker_img)).strip()
-                    bookmaker_logo = bookmaker_img.get('src', "N/A")
-
-                expiry_time_str = "N/A"
-                if (expiry_tag := card.find('div', class_='countdown')) and expiry_tag.has_attr('data-valid-until'):
-                     expiry_time_str = expiry_tag['data-valid-until']
-                
-                offer_link = "N/A"
-                if (offer_link_tag := card.find('a', class_='card__button')) and offer_link_tag.has_attr('href'):
-                    offer_link = offer_link_tag['href']
-                    if offer_link.startswith('/'): offer_link = "https://www.transfermarkt.es" + offer_link
-
-                result["matches"].append({
-                    "league": league, "homeTeam": home_team, "awayTeam": away_team,
-                    "betType": bet_type, "odd": clean_odd_value(odd_value),
-                    "bookmaker": {"name": bookmaker_name, "logo": bookmaker_logo},
-                    "expiryTime": expiry_time_str, "offerLink": offer_link
-                })
-            except Exception as e_card:
-                print(f"Error procesando tarjeta general Transfermarkt: {e_card}")
+    try:
+        extracted, result["fetched_via"] = fetch_page(
+            url, GENERAL_ODDS_MARKER, extract_transfermarkt_general_odds,
+            "Cuotas Generales Transfermarkt", profile="transfermarkt_general")
+        logger.debug("Cuotas Generales Transfermarkt: Contenido cargado")
+        result.update(extracted)
+    except BrowserUnavailable as e:
+        return {"error": "Failed to initialize browser", "details": str(e)}
     except Exception as e:
-        print(f"Error en scraping general Transfermarkt: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error en scraping general Transfermarkt: {str(e)}")
         result["error_scraping"] = f"Error during general Transfermarkt scraping: {str(e)}"
-    finally:
-        if driver:
-            driver.quit()
-            print("Cuotas Generales Transfermarkt: WebDriver cerrado.")
-    print(f"scrape_transfermarkt_general_odds finalizado. Partidos: {len(result.get('matches',[]))}")
+    logger.info(f"scrape_transfermarkt_general_odds finalizado. Partidos: {len(result.get('matches',[]))}")
     return result
 
+# --- Shared Store (caché y locks entre workers de uvicorn) ---
+class SQLiteSharedStore:
+    """Cross-process result store in a SQLite file, with ``fcntl.flock`` locks per key.
+
+    Every uvicorn worker opens the same database. Results are JSON blobs stamped with
+    wall-clock time, so any worker can compute their age. ``lock(key)`` serializes
+    scrapes of one source across processes; without ``fcntl`` (Windows) it only
+    yields, and exclusion is left to the in-process single-flight.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, data BLOB NOT NULL, etag TEXT, stored_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY, task BLOB NOT NULL, expires_at REAL NOT NULL);
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, "shared_cache.db")
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        # Una conexión por hilo: sqlite3 no comparte conexiones entre hilos por defecto
+        if (conn := getattr(self._local, "conn", None)) is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        """``(data, etag, stored_at)`` or None."""
+        row = self._connection().execute("SELECT data, etag, stored_at FROM results WHERE key = ?", (key,)).fetchone()
+        return (loads_bytes(row[0]), row[1], row[2]) if row else None
+
+    def put(self, key, data, etag, stored_at):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO results (key, data, etag, stored_at) VALUES (?, ?, ?, ?)",
+                         (key, dumps_bytes(data), etag, stored_at))
+
+    def stamps(self):
+        """``{key: stored_at}`` for every stored result (cheap change polling)."""
+        return dict(self._connection().execute("SELECT key, stored_at FROM results"))
+
+    def put_task(self, task, ttl):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO tasks (task_id, task, expires_at) VALUES (?, ?, ?)",
+                         (task["task_id"], dumps_bytes(task), time.time() + ttl))
+            conn.execute("DELETE FROM tasks WHERE expires_at < ?", (time.time(),))
+
+    def get_task(self, task_id):
+        row = self._connection().execute("SELECT task FROM tasks WHERE task_id = ? AND expires_at >= ?",
+                                         (task_id, time.time())).fetchone()
+        return loads_bytes(row[0]) if row else None
+
+    @contextmanager
+    def lock(self, key, timeout):
+        """Exclusive lock on ``key`` across processes; yields False if not acquired within ``timeout``."""
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.directory, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.lock"), "a") as f:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        yield False
+                        return
+                    time.sleep(0.1)
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class RedisSharedStore:
+    """Same interface as ``SQLiteSharedStore`` on Redis, for workers spread over several hosts."""
+
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url, prefix="scrapnew:"):
+        import redis  # Dependencia opcional: solo con SHARED_CACHE=redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        row = self.client.hmget(f"{self.prefix}result:{key}", "data", "etag", "stored_at")
+        if row[0] is None:
+            return None
+        return loads_bytes(row[0]), row[1].decode() if row[1] else None, float(row[2])
+
+    def put(self, key, data, etag, stored_at):
+        pipe = self.client.pipeline()
+        pipe.hset(f"{self.prefix}result:{key}", mapping={"data": dumps_bytes(data), "etag": etag or "", "stored_at": stored_at})
+        pipe.hset(f"{self.prefix}stamps", key, stored_at)
+        pipe.execute()
+
+    def stamps(self):
+        return {k.decode(): float(v) for k, v in self.client.hgetall(f"{self.prefix}stamps").items()}
+
+    def put_task(self, task, ttl):
+        self.client.set(f"{self.prefix}task:{task['task_id']}", dumps_bytes(task), ex=max(1, int(ttl)))
+
+    def get_task(self, task_id):
+        raw = self.client.get(f"{self.prefix}task:{task_id}")
+        return loads_bytes(raw) if raw else None
+
+    @contextmanager
+    def lock(self, key, timeout, lease=300):
+        name, token = f"{self.prefix}lock:{key}", uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.client.set(name, token, nx=True, ex=lease):
+            if time.monotonic() >= deadline:
+                yield False
+                return
+            time.sleep(0.1)
+        try:
+            yield True
+        finally:
+            self.client.eval(self.RELEASE_SCRIPT, 1, name, token)
+
+def make_shared_store():
+    """Store selected by SHARED_CACHE (none|sqlite|redis); defaults to sqlite with WEB_CONCURRENCY > 1."""
+    backend = os.environ.get("SHARED_CACHE", "sqlite" if WEB_CONCURRENCY > 1 else "none").lower()
+    if backend == "redis":
+        return RedisSharedStore(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    if backend == "sqlite":
+        return SQLiteSharedStore(SHARED_CACHE_DIR)
+    return None
+
+shared_store = make_shared_store()
+
+# --- Scraper Registry & Result Cache ---
+SCRAPERS = {
+    "liga_odds": scrape_liga_odds,
+    "relevo_news": scrape_relevo_news,
+    "tables_liga": scrape_tablesleague_data,
+    "transfermarkt_general": scrape_transfermarkt_general_odds,
+}
+
+# Registro completo, incluidas las ligas adicionales ("liga_odds:<slug>"), para caché y planificador
+ALL_SCRAPERS = {**SCRAPERS, **{league_cache_key(slug): scrape_fn for slug, scrape_fn in LEAGUE_SCRAPERS.items()},
+                RELEVO_DEEP_KEY: scrape_relevo_news_deep}
+SCRAPER_KEYS = {scrape_fn.__name__: name for name, scrape_fn in ALL_SCRAPERS.items()}
+
+def is_error_result(data):
+    return isinstance(data, dict) and ("error" in data or "error_scraping" in data)
+
+# Campos que cambian en cada scrape aunque los datos sean los mismos
+VOLATILE_FIELDS = ("scraped_at", "fetched_via")
+
+def payload_etag(data):
+    """Weak ETag over the payload, ignoring ``VOLATILE_FIELDS``."""
+    stable = {k: v for k, v in data.items() if k not in VOLATILE_FIELDS}
+    digest = hashlib.sha1(dumps_bytes(stable, sort_keys=True))
+    return f'W/"{digest.hexdigest()}"'
+
+def not_modified_response(request, headers):
+    """304 response if the client's If-None-Match matches our ETag, else None."""
+    etag = headers.get("ETag")
+    if not etag or not (if_none_match := request.headers.get("if-none-match")):
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=304, headers=headers)
+    return None
+
+class _Flight:
+    """A scrape in progress that concurrent callers for the same key wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+        self.exc = None
+
+class ResultCache:
+    """Per-scraper result cache with TTL, stale-while-revalidate and single-flight.
+
+    Fresh entries are returned as-is. Entries older than their TTL but younger than
+    ``stale_ttl`` are returned immediately while one background refresh runs.
+    Concurrent misses for the same key share a single scrape. Error results are
+    handed to the waiting callers but never stored.
+
+    With a ``shared`` store (several uvicorn workers) results are also written there.
+    A refresh takes the store's lock for the key and first adopts any result another
+    process stored meanwhile, so each source is scraped by one worker at a time.
+    ``start_sync`` polls the store so every worker picks up the others' results.
+
+    Results marked ``"partial": True`` (e.g. some parts deferred by the upstream budget)
+    are kept for at most ``partial_ttl`` seconds, so the missing parts are retried soon.
+
+    ``admission(key)`` is called right before an actual scrape and may raise
+    ``UpstreamBudgetExhausted``; ``get`` then serves the last good result (status
+    "BUDGET"), however old, or a budget error if there is none.
+    """
+
+    def __init__(self, default_ttl=300, stale_ttl=3600, ttls=None, shared=None, lock_timeout=120, admission=None,
+                 partial_ttl=30):
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.partial_ttl = partial_ttl
+        self.ttls = ttls or {}
+        self.shared = shared
+        self.lock_timeout = lock_timeout
+        self.admission = admission
+        self._entries = {}  # key -> {"data", "stored_at" (monotonic), "wall" (time.time()), "etag"}
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._sync_stop = threading.Event()
+        self._sync_thread = None
+
+    def add_listener(self, listener, origin_only=False):
+        """Call ``listener(key, data)`` after every successful scrape is stored.
+
+        Listeners also run when a result scraped by another worker is adopted, unless
+        ``origin_only`` (e.g. persistence that the scraping worker already did).
+        """
+        self._listeners.append((listener, origin_only))
+
+    def ttl_for(self, key, data=None):
+        # "liga_odds:<slug>" hereda el TTL de "liga_odds"
+        ttl = self.ttls.get(key, self.ttls.get(key.partition(":")[0], self.default_ttl))
+        if isinstance(data, dict) and data.get("partial"):
+            return min(ttl, self.partial_ttl)
+        return ttl
+
+    def get(self, key, scrape_fn):
+        """Return ``(data, meta)`` where meta holds the cache status, entry age and ETag."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if self.shared and (not entry or time.monotonic() - entry["stored_at"] >= self.ttl_for(key, entry["data"])):
+            entry = self._adopt_shared(key) or entry
+        if entry:
+            age = time.monotonic() - entry["stored_at"]
+            if age < self.ttl_for(key, entry["data"]):
+                metrics.inc("cache_requests_total", key=key, status="HIT")
+                return entry["data"], {"key": key, "status": "HIT", "age": age, "etag": entry["etag"]}
+            if age < self.stale_ttl:
+                self._refresh_in_background(key, scrape_fn)
+                metrics.inc("cache_requests_total", key=key, status="STALE")
+                return entry["data"], {"key": key, "status": "STALE", "age": age, "etag": entry["etag"]}
+        try:
+            data = self.refresh(key, scrape_fn)
+        except UpstreamBudgetExhausted as e:
+            metrics.inc("cache_requests_total", key=key, status="BUDGET")
+            if entry:
+                logger.info(f"ResultCache: {e}; se sirve el último resultado válido.")
+                return entry["data"], {"key": key, "status": "BUDGET", "age": time.monotonic() - entry["stored_at"],
+                                       "etag": entry["etag"]}
+            return budget_exhausted_result(e), {"key": key, "status": "BUDGET", "age": 0.0, "etag": None}
+        with self._lock:
+            entry = self._entries.get(key)
+        etag = entry["etag"] if entry and entry["data"] is data else None
+        metrics.inc("cache_requests_total", key=key, status="MISS")
+        return data, {"key": key, "status": "MISS", "age": 0.0, "etag": etag}
+
+    def refresh(self, key, scrape_fn, fresh_within=0):
+        """Scrape ``key`` now, joining an in-flight scrape for the same key if there is one.
+
+        With a shared store, a result another worker stored less than ``fresh_within``
+        seconds ago (or while we waited for its lock) is adopted instead of scraping.
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.exc:
+                raise flight.exc
+            return flight.data
+        try:
+            requested_at = time.time()
+            with (self.shared.lock(key, self.lock_timeout) if self.shared else nullcontext(True)) as locked:
+                if not locked:
+                    logger.warning(f"ResultCache: lock compartido de '{key}' no obtenido en {self.lock_timeout}s, se scrapea igualmente.")
+                if self.shared and (entry := self._adopt_shared(key)) and \
+                   entry["wall"] >= min(requested_at, time.time() - fresh_within):
+                    flight.data = entry["data"]
+                    return flight.data
+                if self.admission:
+                    self.admission(key)
+                flight.data = scrape_fn()
+                if not is_error_result(flight.data):
+                    self._store(key, flight.data)
+            return flight.data
+        except Exception as e:
+            flight.exc = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def last_good(self, key):
+        """The last successful result for ``key`` (local or from the shared store), however old."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if self.shared:
+            entry = self._adopt_shared(key) or entry
+        return entry["data"] if entry else None
+
+    def _store(self, key, data):
+        entry = {"data": data, "stored_at": time.monotonic(), "wall": time.time(), "etag": payload_etag(data)}
+        with self._lock:
+            self._entries[key] = entry
+        if self.shared:
+            try:
+                self.shared.put(key, data, entry["etag"], entry["wall"])
+            except Exception as e:
+                logger.warning(f"ResultCache: no se pudo escribir '{key}' en la caché compartida: {e}")
+        self._notify(key, data, origin=True)
+
+    def _adopt_shared(self, key):
+        """Load ``key`` from the shared store if it is newer than our entry; returns the current entry."""
+        try:
+            row = self.shared.get(key)
+        except Exception as e:
+            logger.warning(f"ResultCache: fallo leyendo '{key}' de la caché compartida: {e}")
+            row = None
+        with self._lock:
+            local = self._entries.get(key)
+            if row is None or (local and local["wall"] >= row[2]):
+                return local
+            data, etag, wall = row
+            entry = self._entries[key] = {"data": data, "etag": etag, "wall": wall,
+                                          "stored_at": time.monotonic() - max(0.0, time.time() - wall)}
+        if not local or local["etag"] != etag:
+            self._notify(key, data, origin=False)
+        return entry
+
+    def start_sync(self, interval=1.0):
+        """Poll the shared store and adopt results stored by other workers (push feed, versions)."""
+        if not self.shared or self._sync_thread:
+            return
+        def _run():
+            while not self._sync_stop.wait(interval):
+                try:
+                    stamps = self.shared.stamps()
+                except Exception as e:
+                    logger.warning(f"ResultCache: fallo consultando la caché compartida: {e}")
+                    continue
+                for key, wall in stamps.items():
+                    with self._lock:
+                        local = self._entries.get(key)
+                    if not local or local["wall"] < wall:
+                        self._adopt_shared(key)
+        self._sync_stop.clear()
+        self._sync_thread = threading.Thread(target=_run, name="cache-sync", daemon=True)
+        self._sync_thread.start()
+
+    def stop_sync(self):
+        self._sync_stop.set()
+        if self._sync_thread:
+            self._sync_thread.join(timeout=5)
+            self._sync_thread = None
+
+    def _notify(self, key, data, origin=True):
+        for listener, origin_only in self._listeners:
+            if origin_only and not origin:
+                continue
+            try:
+                listener(key, data)
+            except Exception as e:
+                logger.exception(f"ResultCache: error en listener {getattr(listener, '__name__', listener)} para '{key}': {e}")
+
+    def _refresh_in_background(self, key, scrape_fn):
+        with self._lock:
+            if key in self._inflight:
+                return
+        def _run():
+            try:
+                self.refresh(key, scrape_fn)
+            except UpstreamBudgetExhausted as e:
+                logger.info(f"ResultCache: refresco de '{key}' aplazado: {e}")
+            except Exception as e:
+                logger.warning(f"ResultCache: fallo al refrescar '{key}' en segundo plano: {e}")
+        threading.Thread(target=_run, name=f"cache-refresh-{key}", daemon=True).start()
+
+def cache_headers(data, meta):
+    headers = {"X-Cache": meta["status"], "Age": str(int(meta["age"]))}
+    if isinstance(data, dict) and data.get("scraped_at"):
+        headers["X-Scraped-At"] = data["scraped_at"]
+    if isinstance(data, dict) and data.get("fetched_via"):
+        headers["X-Fetched-Via"] = data["fetched_via"]
+    if meta.get("etag"):
+        headers["ETag"] = meta["etag"]
+        if (version := result_versions.version_for(meta["key"], meta["etag"])) is not None:
+            headers["X-Result-Version"] = str(version)
+    if SERVER_TIMING:
+        # En un MISS la respuesta ha esperado al scrape completo: se detallan sus etapas
+        spans = last_scrape_timings.get(meta.get("key"), []) if meta["status"] == "MISS" else []
+        headers["Server-Timing"] = ", ".join(filter(None, [f'cache;desc="{meta["status"]}"', server_timing_value(spans)]))
+    return headers
+
+_default_cache_ttl = float(os.environ.get("CACHE_TTL_SECONDS", 300))
+result_cache = ResultCache(
+    default_ttl=_default_cache_ttl,
+    stale_ttl=float(os.environ.get("CACHE_STALE_SECONDS", 3600)),
+    partial_ttl=float(os.environ.get("CACHE_PARTIAL_TTL_SECONDS", 30)),
+    # Permite ajustar el TTL por scraper, p. ej. CACHE_TTL_TABLES_LIGA=1800
+    ttls={name: float(os.environ.get(f"CACHE_TTL_{name.upper()}", _default_cache_ttl)) for name in SCRAPERS},
+    shared=shared_store,
+    lock_timeout=float(os.environ.get("SHARED_LOCK_TIMEOUT_SECONDS", 120)),
+    admission=upstream_budget.admit if UPSTREAM_BUDGET_ENABLED else None,
+)
+
+# --- Result Versions & Incremental Diffs ---
+# Identidad de cada entrada para calcular diffs: (campo con la lista, función que devuelve su clave)
+ENTRY_IDENTITY = {
+    "transfermarkt_general": ("matches", lambda m: {
+        "league": m.get("league"), "homeTeam": m.get("homeTeam"), "awayTeam": m.get("awayTeam"),
+        "betType": m.get("betType"), "bookmaker": (m.get("bookmaker") or {}).get("name")}),
+    "relevo_news": ("articles", lambda a: {"link": a.get("link")}),
+}
+ENTRY_IDENTITY[RELEVO_DEEP_KEY] = ENTRY_IDENTITY["relevo_news"]
+
+class ResultVersions:
+    """Version numbers for every scraper result, plus a short history to diff against.
+
+    A key gets a new version only when its payload ETag changes. The version is
+    derived from the ETag itself (52 bits, safe as a JSON number) instead of a
+    counter, so every uvicorn worker and every restart hands out the same version
+    for the same content and a client's ``since`` stays valid across them. Versions
+    are therefore opaque content identifiers, not ordered: a newer result may have a
+    smaller number. Clients must send back an ``X-Result-Version`` exactly as received
+    and never compare two versions; an unknown ``since`` gets the full payload. For keys
+    in ``ENTRY_IDENTITY`` the last ``history`` versions are kept as ``identity -> entry``
+    indexes; ``diff`` turns two of them into added/changed/removed lists.
+    """
+
+    def __init__(self, history=30):
+        self.history = history
+        self._versions = {}  # key -> deque of {"version", "etag", "index"}
+        self._lock = threading.Lock()
+
+    def record(self, key, data):
+        """``ResultCache`` listener: assign a version if the payload changed."""
+        etag = payload_etag(data)
+        with self._lock:
+            versions = self._versions.setdefault(key, deque(maxlen=self.history))
+            if versions and versions[-1]["etag"] == etag:
+                return versions[-1]["version"]
+            version = int(etag.removeprefix("W/").strip('"')[:13], 16)
+            versions.append({"version": version, "etag": etag, "index": self._index(key, data)})
+            return version
+
+    @staticmethod
+    def _index(key, data):
+        if key not in ENTRY_IDENTITY:
+            return None
+        field, identity = ENTRY_IDENTITY[key]
+        index = {}
+        for entry in data.get(field) or []:
+            entry_id = identity(entry)
+            index.setdefault(tuple(entry_id.values()), (entry_id, entry))
+        return index
+
+    def version_for(self, key, etag):
+        """Version of the result with this ETag (the latest one if it recurred), or None."""
+        with self._lock:
+            return next((v["version"] for v in reversed(self._versions.get(key, ())) if v["etag"] == etag), None)
+
+    def diff(self, key, since, etag):
+        """Changes from version ``since`` to the result with ``etag``; None if either is no longer known."""
+        with self._lock:
+            versions = list(self._versions.get(key, ()))
+        target = next((v for v in reversed(versions) if v["etag"] == etag), None)
+        base = next((v for v in versions if v["version"] == since), None)
+        if target is None or base is None or target["index"] is None:
+            return None
+        old, new = base["index"], target["index"]
+        return {
+            "version": target["version"], "since": since,
+            "added": [entry for k, (_, entry) in new.items() if k not in old],
+            "changed": [entry for k, (_, entry) in new.items() if k in old and old[k][1] != entry],
+            "removed": [entry_id for k, (entry_id, _) in old.items() if k not in new],
+        }
+
+result_versions = ResultVersions(history=int(os.environ.get("RESULT_VERSION_HISTORY", 30)))
+result_cache.add_listener(result_versions.record)
+
+# --- Exportación columnar: filas planas de cada resultado ---
+# Las columnas se rellenan directamente desde los dicts del resultado en caché, fila a fila,
+# sin construir objetos intermedios; los dicts de ResultCache se comparten tal cual.
+def _na(value):
+    """``None`` for the scrapers' placeholders ("N/A", empty), the value otherwise."""
+    return None if value in (None, "", "N/A") else value
+
+def _odd_as_float(odd):
+    try:
+        return float(odd)
+    except (TypeError, ValueError):
+        return None
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def match_odds_rows(data):
+    """League betting page: one row per match tip, title-winner odd or combined-bet leg."""
+    league = data.get("league", "la-liga")
+    for m in data.get("matches", []):
+        yield (league, "partido", _na(m.get("teams")), _na(m.get("date")), _na(m.get("stadium")),
+               _na(m.get("prediction")), "Transfermarkt", _odd_as_float(m.get("odd")), _na(m.get("odd")))
+    for team_odds in data.get("title_odds", []):
+        for bookmaker, odd in team_odds.items():
+            if bookmaker != "team":
+                yield (league, "ganador", None, None, None, _na(team_odds.get("team")), bookmaker,
+                       _odd_as_float(odd), _na(odd))
+    for bet in (data.get("combined_bet") or {}).get("bets", []):
+        yield (league, "combinada", _na(bet.get("match")), None, None, _na(bet.get("bet")), None,
+               _odd_as_float(bet.get("odd")), _na(bet.get("odd")))
+
+def odds_offer_rows(data):
+    """General odds page: one row per bookmaker offer."""
+    for m in data.get("matches", []):
+        bookmaker = m.get("bookmaker") or {}
+        yield (_na(m.get("league")), _na(m.get("homeTeam")), _na(m.get("awayTeam")), _na(m.get("betType")),
+               _odd_as_float(m.get("odd")), _na(m.get("odd")), _na(bookmaker.get("name")),
+               _na(bookmaker.get("logo")), _na(m.get("expiryTime")), _na(m.get("offerLink")))
+
+def article_rows(data):
+    """Relevo: one row per article; ``body``/``tags``/``section`` are only filled in deep mode."""
+    for a in data.get("articles", []):
+        authors = tuple(n for au in a.get("authors") or [] if (n := _na(au.get("name"))))
+        yield (_na(a.get("title")), _na(a.get("link")), authors, _na(a.get("publication_date_iso")),
+               _na(a.get("image_url")), _na(a.get("section")), tuple(a.get("tags") or []), _na(a.get("body")))
+
+STANDING_STAT_COLUMNS = ("Position", "Team", "Played", "Won", "Drawn", "Lost", "GoalsFor", "GoalsAgainst",
+                         "GoalDifference", "Points")
+
+def standing_rows(data):
+    """TablesLeague: one row per team of every standings table."""
+    for league in data.get("leagues", []):
+        for team in league.get("teams", []):
+            yield (league.get("name"), *(team.get(c) if c == "Team" else _as_int(team.get(c))
+                                         for c in STANDING_STAT_COLUMNS))
+
+def odds_movement_rows(movements):
+    """Snapshot store history: one row per change of an odd."""
+    for m in movements:
+        yield m["match_key"], m["bookmaker"], m["bet_type"], m["odd_value"], m["odd"], m["observed_at"]
+
+ODDS_MOVEMENT_FIELDS = ("match", "bookmaker", "bet_type", "odd", "odd_text", "observed_at")
+
+# Campos y generador de filas por clave de caché (las ligas y el modo profundo heredan los de su prefijo)
+RESULT_EXPORTS = {
+    "liga_odds": (("league", "market", "match", "date", "stadium", "selection", "bookmaker", "odd", "odd_text"),
+                  match_odds_rows),
+    "transfermarkt_general": (("league", "home_team", "away_team", "bet_type", "odd", "odd_text", "bookmaker",
+                               "bookmaker_logo", "expiry_time", "offer_link"), odds_offer_rows),
+    "relevo_news": (("title", "link", "authors", "published", "image_url", "section", "tags", "body"), article_rows),
+    "tables_liga": (("league", "position", "team", "played", "won", "drawn", "lost", "goals_for", "goals_against",
+                     "goal_difference", "points"), standing_rows),
+}
+
+def export_layout(key):
+    return RESULT_EXPORTS.get(key.partition(":")[0])
+
+def rows_to_columns(fields, rows):
+    """``({field: [value per row]}, row count)``, filling the columns as the rows are generated."""
+    columns = {name: [] for name in fields}
+    appends = [column.append for column in columns.values()]
+    count = 0
+    for row in rows:
+        for append, value in zip(appends, row):
+            append(value)
+        count += 1
+    return columns, count
+
+# Exportación columnar: CSV compacto siempre; Arrow IPC y Parquet si pyarrow está instalado (backend "arrow")
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def encode_columns(columns, fmt):
+    """Serialize ``{field: values}`` as CSV, an Arrow IPC stream or Parquet."""
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(columns)
+        # Listas (autores, etiquetas) en una celda separadas por "|"; None como celda vacía
+        writer.writerows(tuple("|".join(v) if isinstance(v, tuple) else "" if v is None else v for v in row)
+                         for row in zip(*columns.values()))
+        return out.getvalue().encode("utf-8")
+    pyarrow = load_backend("arrow")
+    table = pyarrow.table({name: [list(v) if isinstance(v, tuple) else v for v in values]
+                           for name, values in columns.items()})
+    sink = pyarrow.BufferOutputStream()
+    if fmt == "parquet":
+        pyarrow.parquet.write_table(table, sink, compression="zstd")
+    else:
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# --- Snapshot Store (histórico de cuotas en SQLite) ---
+
+def liga_odds_rows(data):
+    """Normalize a scrape_liga_odds result into (match_key, bookmaker, bet_type, odd, extra) rows."""
+    rows = []
+    for match in data.get("matches", []):
+        rows.append((match.get("teams", "N/A"), "Transfermarkt", match.get("prediction", "N/A"), match.get("odd", "N/A"),
+                     {"date": match.get("date"), "stadium": match.get("stadium")}))
+    for team_odds in data.get("title_odds", []):
+        team = team_odds.get("team", "N/A")
+        for bookmaker, odd in team_odds.items():
+            if bookmaker != "team":
+                rows.append((f"Ganador de la liga|{team}", bookmaker, "Ganador de la liga", odd, None))
+    for bet in (data.get("combined_bet") or {}).get("bets", []):
+        rows.append((bet.get("match", "N/A"), "Apuesta combinada", bet.get("bet", "N/A"), bet.get("odd", "N/A"), None))
+    return rows
+
+def general_odds_rows(data):
+    """Normalize a scrape_transfermarkt_general_odds result into store rows."""
+    rows = []
+    for match in data.get("matches", []):
+        bookmaker = match.get("bookmaker") or {}
+        match_key = f"{match.get('league', 'N/A')}|{match.get('homeTeam', 'N/A')}|{match.get('awayTeam', 'N/A')}"
+        rows.append((match_key, bookmaker.get("name", "N/A"), match.get("betType", "N/A"), match.get("odd", "N/A"),
+                     {"expiryTime": match.get("expiryTime"), "offerLink": match.get("offerLink")}))
+    return rows
+
+ODDS_ROW_NORMALIZERS = {"liga_odds": liga_odds_rows, "transfermarkt_general": general_odds_rows}
+
+def odds_normalizer(source):
+    """Row normalizer for ``source``; league keys such as ``liga_odds:serie-a`` share the La Liga one."""
+    return ODDS_ROW_NORMALIZERS.get(source.partition(":")[0])
+
+ODDS_SOURCES = [key for key in ALL_SCRAPERS if odds_normalizer(key)]
+
+class OddsSnapshotStore:
+    """Embedded SQLite store of odds snapshots.
+
+    ``odds_latest`` holds the current odd per (source, match, bookmaker, bet type);
+    ``odds_history`` only receives a row when that odd is new or has changed, so the
+    history is a compact time series of odds movements.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scrape_runs (
+            source TEXT NOT NULL, scraped_at TEXT NOT NULL, row_count INTEGER NOT NULL, changed_count INTEGER NOT NULL,
+            PRIMARY KEY (source, scraped_at));
+        CREATE TABLE IF NOT EXISTS odds_latest (
+            source TEXT NOT NULL, match_key TEXT NOT NULL, bookmaker TEXT NOT NULL, bet_type TEXT NOT NULL,
+            odd TEXT, odd_value REAL, extra TEXT, first_seen TEXT NOT NULL, last_seen TEXT NOT NULL,
+            PRIMARY KEY (source, match_key, bookmaker, bet_type));
+        CREATE INDEX IF NOT EXISTS idx_latest_last_seen ON odds_latest (source, last_seen);
+        CREATE TABLE IF NOT EXISTS odds_history (
+            id INTEGER PRIMARY KEY, source TEXT NOT NULL, match_key TEXT NOT NULL, bookmaker TEXT NOT NULL,
+            bet_type TEXT NOT NULL, odd TEXT, odd_value REAL, observed_at TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_history_match_time ON odds_history (source, match_key, observed_at);
+        CREATE INDEX IF NOT EXISTS idx_history_time ON odds_history (source, observed_at);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def record(self, source, data):
+        """Store one scrape result; returns the number of rows whose odd changed."""
+        if not (normalize := odds_normalizer(source)):
+            return 0
+        observed_at = data.get("scraped_at") or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = {(match_key, bookmaker, bet_type): (odd, extra)
+                for match_key, bookmaker, bet_type, odd, extra in normalize(data)}
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                current = {(r["match_key"], r["bookmaker"], r["bet_type"]): r["odd"] for r in conn.execute(
+                    "SELECT match_key, bookmaker, bet_type, odd FROM odds_latest WHERE source = ?", (source,))}
+                changed = [(source, *key, odd, _odd_as_float(odd), observed_at)
+                           for key, (odd, _) in rows.items() if current.get(key) != odd]
+                conn.executemany(
+                    "INSERT INTO odds_history (source, match_key, bookmaker, bet_type, odd, odd_value, observed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", changed)
+                conn.executemany(
+                    "INSERT INTO odds_latest (source, match_key, bookmaker, bet_type, odd, odd_value, extra, first_seen, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (source, match_key, bookmaker, bet_type) DO UPDATE SET "
+                    "odd = excluded.odd, odd_value = excluded.odd_value, extra = excluded.extra, last_seen = excluded.last_seen",
+                    [(source, *key, odd, _odd_as_float(odd), json.dumps(extra, ensure_ascii=False) if extra else None,
+                      observed_at, observed_at) for key, (odd, extra) in rows.items()])
+                conn.execute("INSERT OR REPLACE INTO scrape_runs (source, scraped_at, row_count, changed_count) VALUES (?, ?, ?, ?)",
+                             (source, observed_at, len(rows), len(changed)))
+        logger.info(f"OddsSnapshotStore: {source} {observed_at}: {len(rows)} cuotas, {len(changed)} cambios guardados.")
+        return len(changed)
+
+    def latest(self, source, include_stale=False):
+        """Rows seen in the last stored scrape of ``source`` (or every row ever seen)."""
+        with self._lock:
+            conn = self._connection()
+            run = conn.execute("SELECT scraped_at, row_count FROM scrape_runs WHERE source = ? "
+                               "ORDER BY scraped_at DESC LIMIT 1", (source,)).fetchone()
+            if not run:
+                return None, []
+            query = "SELECT * FROM odds_latest WHERE source = ?" + ("" if include_stale else " AND last_seen = ?")
+            params = (source,) if include_stale else (source, run["scraped_at"])
+            rows = conn.execute(query + " ORDER BY match_key, bookmaker, bet_type", params).fetchall()
+        return run["scraped_at"], [self._row_dict(r) for r in rows]
+
+    def history(self, source, match=None, bookmaker=None, since=None, until=None, limit=5000):
+        """Odds movements of ``source`` in [since, until], oldest first per series."""
+        clauses, params = ["source = ?"], [source]
+        # "%" y "_" del texto buscado son literales, no comodines de LIKE
+        pattern = "%{}%".format(re.sub(r"([\\%_])", r"\\\1", match)) if match else None
+        for column, op, value in (("match_key", "LIKE", pattern), ("bookmaker", "=", bookmaker),
+                                  ("observed_at", ">=", since), ("observed_at", "<=", until)):
+            if value:
+                clauses.append(f"{column} {op} ?" + (" ESCAPE '\\'" if op == "LIKE" else ""))
+                params.append(value)
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT match_key, bookmaker, bet_type, odd, odd_value, observed_at FROM odds_history "
+                f"WHERE {' AND '.join(clauses)} ORDER BY match_key, bookmaker, bet_type, observed_at LIMIT ?",
+                (*params, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    def _row_dict(row):
+        item = dict(row)
+        item["extra"] = json.loads(item["extra"]) if item["extra"] else None
+        return item
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+SNAPSHOT_STORE_ENABLED = os.environ.get("SNAPSHOT_STORE", "true").lower() == "true"
+snapshot_store = OddsSnapshotStore(os.environ.get("SNAPSHOT_DB_PATH", os.path.join(SHARED_CACHE_DIR, "snapshots.db")))
+
+def record_odds_snapshot(key, data):
+    if SNAPSHOT_STORE_ENABLED and odds_normalizer(key):
+        snapshot_store.record(key, data)
+
+# Solo el worker que scrapea persiste; los demás adoptan el resultado ya guardado
+result_cache.add_listener(record_odds_snapshot, origin_only=True)
+
+# --- Push Feed (eventos de cambios de cuotas) ---
+class OddsChangeDetector:
+    """Turns consecutive odds results into change events.
+
+    Rows come from ``odds_normalizer`` and are keyed by (match, bookmaker, bet
+    type). A refresh yields ``odd_changed``, ``new_offer``, ``offer_removed`` and
+    ``offer_expired`` events. An offer is ``offer_expired`` when its ``expiryTime`` has
+    passed, whether or not the site still lists it. The first result per source is only
+    a baseline, so a restart does not announce every offer again.
+    """
+
+    def __init__(self):
+        self._previous = {}  # source -> {(match, bookmaker, bet_type): (odd, extra)}
+        self._expired = {}  # source -> claves ya anunciadas como caducadas
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_expired(extra, now):
+        if not extra or (expiry := extra.get("expiryTime")) in (None, "", "N/A"):
+            return False
+        try:
+            expiry_dt = parse(expiry)
+        except (ValueError, OverflowError):
+            return False
+        return (expiry_dt if expiry_dt.tzinfo else expiry_dt.astimezone()) <= now
+
+    def changes(self, source, data):
+        now = datetime.now().astimezone()
+        current = {(match, bookmaker, bet_type): (odd, extra)
+                   for match, bookmaker, bet_type, odd, extra in odds_normalizer(source)(data)}
+        with self._lock:
+            previous = self._previous.get(source)
+            self._previous[source] = current
+            expired = self._expired.setdefault(source, set())
+            if previous is None:
+                expired.update(k for k, (_, extra) in current.items() if self._is_expired(extra, now))
+                return []
+            events = []
+            for key, (odd, extra) in current.items():
+                if key not in expired and self._is_expired(extra, now):
+                    expired.add(key)
+                    events.append(("offer_expired", key, odd, extra, None))
+                elif key not in previous:
+                    events.append(("new_offer", key, odd, extra, None))
+                elif previous[key][0] != odd:
+                    events.append(("odd_changed", key, odd, extra, previous[key][0]))
+            for key, (odd, extra) in previous.items():
+                if key not in current and key not in expired:
+                    events.append(("offer_expired" if self._is_expired(extra, now) else "offer_removed", key, odd, extra, None))
+            expired.intersection_update(current)
+        return [{"type": kind, "source": source, "match": key[0], "bookmaker": key[1], "bet_type": key[2],
+                 "odd": odd, **({"previous_odd": previous_odd} if previous_odd is not None else {}),
+                 **({k: v for k, v in extra.items() if v not in (None, "N/A")} if extra else {}),
+                 "scraped_at": data.get("scraped_at")}
+                for kind, key, odd, extra, previous_odd in events]
+
+class _Subscriber:
+    def __init__(self, loop, queue_size, sources):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sources = sources
+        self.dropped = False
+
+class OddsEventBroker:
+    """In-process fan-out of odds events to SSE/WebSocket subscribers.
+
+    ``publish`` is called from scraper threads. Every event is serialized once and
+    handed to each event loop in a single ``call_soon_threadsafe`` call. Each subscriber
+    has a bounded queue: a subscriber whose queue fills up is dropped, and its stream
+    ends with a ``dropped`` event, so one slow client never holds back the others or
+    grows memory.
+    """
+
+    def __init__(self, queue_size=256, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, sources=None):
+        """Register a subscriber on the running loop; None if ``max_subscribers`` is reached."""
+        subscriber = _Subscriber(asyncio.get_running_loop(), self.queue_size, sources)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, events):
+        if not events:
+            return
+        with self._lock:
+            encoded = []
+            for event in events:
+                self._next_id += 1
+                encoded.append((event["source"], self._next_id, event["type"], dumps_bytes({"id": self._next_id, **event})))
+            loops = {s.loop for s in self._subscribers}
+        for event in events:
+            metrics.inc("push_events_total", source=event["source"], type=event["type"])
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._fan_out, loop, encoded)
+            except RuntimeError:
+                pass  # Bucle ya cerrado
+
+    def _fan_out(self, loop, encoded):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.loop is loop]
+        for subscriber in subscribers:
+            for source, event_id, kind, payload in encoded:
+                if subscriber.sources and source not in subscriber.sources:
+                    continue
+                try:
+                    subscriber.queue.put_nowait((event_id, kind, payload))
+                except asyncio.QueueFull:
+                    self._drop(subscriber)
+                    break
+
+    def _drop(self, subscriber):
+        self.unsubscribe(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait((None, "dropped", dumps_bytes({"type": "dropped", "reason": "slow consumer"})))
+        metrics.inc("push_dropped_subscribers_total")
+        logger.warning("OddsEventBroker: suscriptor lento desconectado (cola llena).")
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+odds_change_detector = OddsChangeDetector()
+odds_event_broker = OddsEventBroker(
+    queue_size=int(os.environ.get("PUSH_QUEUE_SIZE", 256)),
+    max_subscribers=int(os.environ.get("PUSH_MAX_SUBSCRIBERS", 1000)),
+)
+
+def publish_odds_events(key, data):
+    if odds_normalizer(key):
+        odds_event_broker.publish(odds_change_detector.changes(key, data))
+
+result_cache.add_listener(publish_odds_events)
+
 # --- API Endpoints ---
 
-# ----- Gestión de Tareas en Segundo Plano (Conceptual - MUY RECOMENDADO PARA PRODUCCIÓN) -----
-# tasks_db = {} 
-# def run_scrape_in_background(task_id: str, scrape_function, *args):
-#     try:
-#         print(f"Background task {task_id} ({scrape_function.__name__}) started.")
-#         data = scrape_function(*args)
-#         tasks_db[task_id] = {"status": "completed", "data": data, "timestamp": datetime.now().isoformat()}
-#         print(f"Background task {task_id} completed.")
-#     except Exception as e:
-#         print(f"Background task {task_id} failed: {str(e)}")
-#         tasks_db[task_id] = {"status": "failed", "error": str(e), "trace": traceback.format_exc(), "timestamp": datetime.now().isoformat()}
-
-# @app.post("/v2/start-scraping-task/{scraper_name}")
-# async def start_background_task_v2(scraper_name: str, background_tasks: BackgroundTasks):
-#     task_id = f"{scraper_name}_{int(datetime.now().timestamp())}"
-#     tasks_db[task_id] = {"status": "pending", "task_id": task_id, "scraper_name": scraper_name, "started_at": datetime.now().isoformat()}
-#     scrape_func_map = {
-#         "liga_odds": scrape_liga_odds, "relevo_news": scrape_relevo_news, 
-#         "transfermarkt_general": scrape_transfermarkt_general_odds, "tables_liga": scrape_tablesleague_data
-#     }
-#     if scraper_name not in scrape_func_map:
-#         return JSONResponse(content={"error": "Invalid scraper name"}, status_code=400)
-#     background_tasks.add_task(run_scrape_in_background, task_id, scrape_func_map[scraper_name])
-#     return JSONResponse(content=tasks_db[task_id], status_code=202)
-
-# @app.get("/v2/scraping-task-status/{task_id}")
-# async def get_task_status_v2(task_id: str):
-#     task = tasks_db.get(task_id)
-#     if not task:
-#         return JSONResponse(content={"error": "Task not found"}, status_code=404)
-#     # Si la tarea se completó, podrías decidir devolver el status_code original del scraper si tuvo error
-#     if task.get("status") == "completed" and task.get("data", {}).get("error"):
-#         if task["data"]["error"] == "Failed to initialize browser":
-#             return JSONResponse(content=task, status_code=503)
-#         return JSONResponse(content=task, status_code=500) # O 200 con el error dentro de "data"
-#     return JSONResponse(content=task)
+# ----- Gestión de Tareas en Segundo Plano (cola acotada + pool de workers) -----
+class ScrapeJobQueue:
+    """Bounded job queue drained by a fixed pool of worker threads.
+
+    Jobs run off the uvicorn event loop. At most one job per scraper is pending or
+    running at a time: submitting again returns the existing job. Finished jobs are
+    evicted from ``tasks_db`` ``job_ttl`` seconds after they complete. With a
+    ``shared`` store every status change is also written there, so a task can be
+    polled on any uvicorn worker.
+    """
+
+    def __init__(self, workers=2, max_queue=16, job_ttl=900, shared=None):
+        self.workers = max(1, workers)
+        self.job_ttl = job_ttl
+        self.shared = shared
+        self.tasks_db = {}
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._active = {}  # scraper_name -> task_id pendiente o en curso
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"scrape-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"ScrapeJobQueue: {self.workers} worker(s) iniciados.")
+
+    def stop(self, timeout=5):
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, scraper_name, scrape_fn):
+        """Queue a scrape. Returns ``(task, created)``; raises ``queue.Full`` if the queue is saturated."""
+        self._evict_expired()
+        with self._lock:
+            if (task_id := self._active.get(scraper_name)) and task_id in self.tasks_db:
+                return self.tasks_db[task_id], False
+            task_id = f"{scraper_name}_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
+            task = {"status": "pending", "task_id": task_id, "scraper_name": scraper_name,
+                    "started_at": datetime.now().isoformat()}
+            self._queue.put_nowait((task_id, scraper_name, scrape_fn))
+            self.tasks_db[task_id] = task
+            self._active[scraper_name] = task_id
+        self._share(task)
+        return task, True
+
+    def get(self, task_id):
+        self._evict_expired()
+        if (task := self.tasks_db.get(task_id)) is None and self.shared:
+            try:
+                task = self.shared.get_task(task_id)
+            except Exception as e:
+                logger.warning(f"ScrapeJobQueue: fallo leyendo la tarea {task_id} compartida: {e}")
+        return task
+
+    def _share(self, task):
+        if not self.shared:
+            return
+        try:
+            self.shared.put_task({k: v for k, v in task.items() if k != "finished_at"}, self.job_ttl)
+        except Exception as e:
+            logger.warning(f"ScrapeJobQueue: no se pudo compartir la tarea {task['task_id']}: {e}")
+
+    def _worker(self):
+        while (item := self._queue.get()) is not None:
+            self.run_scrape_in_background(*item)
+
+    def run_scrape_in_background(self, task_id, scraper_name, scrape_fn):
+        task = self.tasks_db[task_id]
+        task["status"] = "running"
+        self._share(task)
+        logger.debug(f"Background task {task_id} ({scrape_fn.__name__}) started.")
+        try:
+            # Pasa por la caché para compartir el scrape con los endpoints síncronos
+            try:
+                data = result_cache.refresh(scraper_name, scrape_fn)
+            except UpstreamBudgetExhausted as e:
+                data = result_cache.last_good(scraper_name) or budget_exhausted_result(e)
+            task.update({"status": "completed", "data": data, "timestamp": datetime.now().isoformat()})
+            logger.info(f"Background task {task_id} completed.")
+        except Exception as e:
+            logger.exception(f"Background task {task_id} failed: {str(e)}")
+            task.update({"status": "failed", "error": str(e), "trace": traceback.format_exc(),
+                         "timestamp": datetime.now().isoformat()})
+        finally:
+            task["finished_at"] = time.monotonic()
+            self._share(task)
+            with self._lock:
+                if self._active.get(scraper_name) == task_id:
+                    del self._active[scraper_name]
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.job_ttl
+        with self._lock:
+            expired = [tid for tid, t in self.tasks_db.items() if t.get("finished_at", cutoff + 1) < cutoff]
+            for tid in expired:
+                del self.tasks_db[tid]
+
+job_queue = ScrapeJobQueue(
+    workers=int(os.environ.get("SCRAPE_WORKERS", 2)),
+    max_queue=int(os.environ.get("SCRAPE_QUEUE_SIZE", 16)),
+    job_ttl=float(os.environ.get("JOB_TTL_SECONDS", 900)),
+    shared=shared_store,
+)
+
+def _public_task(task):
+    return {k: v for k, v in task.items() if k != "finished_at"}
+
+@app.post("/v2/start-scraping-task/{scraper_name}")
+def start_background_task_v2(scraper_name: str):
+    if scraper_name not in SCRAPERS:
+        return FastJSONResponse(content={"error": "Invalid scraper name", "available": list(SCRAPERS)}, status_code=400)
+    try:
+        task, created = job_queue.submit(scraper_name, SCRAPERS[scraper_name])
+    except queue.Full:
+        return FastJSONResponse(content={"error": "Scraping queue is full, retry later"}, status_code=503,
+                            headers={"Retry-After": "10"})
+    content = {**_public_task(task), "deduplicated": not created}
+    return FastJSONResponse(content=content, status_code=202,
+                        headers={"Location": f"/v2/scraping-task-status/{task['task_id']}"})
+
+@app.get("/v2/scraping-task-status/{task_id}")
+def get_task_status_v2(task_id: str):
+    task = job_queue.get(task_id)
+    if not task:
+        return FastJSONResponse(content={"error": "Task not found"}, status_code=404)
+    content = _public_task(task)
+    if task["status"] in ("pending", "running"):
+        return FastJSONResponse(content=content, status_code=202, headers={"Retry-After": "2"})
+    if task["status"] == "failed":
+        return FastJSONResponse(content=content, status_code=500)
+    # Si la tarea se completó con error del scraper, se propaga el mismo código que en la API síncrona
+    status_code, headers = scraper_status(task.get("data") or {})
+    return FastJSONResponse(content=content, status_code=status_code, headers=headers)
+
 # ----- Endpoints Síncronos Actuales (Propensos a Timeouts para Scrapers con Selenium) -----
 
 @app.get("/")
@@ -527,80 +3023,535 @@ def root():
             "/raspar-cuotas-liga", "/raspar-noticias-relevo",
             "/raspar-tablas-liga", "/raspar-cuotas-generales-transfermarkt"
         ],
-        "rutas_asincronas_recomendadas (ver comentarios en código)": [
+        "rutas_agregadas": ["/raspar-todo", "/raspar-todo/stream"],
+        "rutas_ligas": ["/raspar-cuotas/{league}", "/raspar-cuotas?ligas=premier-league,serie-a"],
+        "ligas_disponibles": list(LEAGUES),
+        "rutas_historico": ["/cuotas-ultimas/{source}", "/historial-cuotas/{source}"],
+        "rutas_exportacion": ["/exportar/{scraper}?formato=csv|arrow|parquet", "/exportar-historial/{source}"],
+        "rutas_eventos": ["/eventos-cuotas (SSE)", "/ws/eventos-cuotas (WebSocket)"],
+        "rutas_estado": ["/metrics", "/planificador", "/navegadores", "/limites"],
+        "diffs_incrementales": ("?since=<X-Result-Version> en /raspar-noticias-relevo y /raspar-cuotas-generales-transfermarkt; "
+                                "la versión es un identificador opaco del contenido, no un número creciente: "
+                                "se reenvía tal cual y nunca se compara"),
+        "rutas_asincronas_recomendadas": [
             "POST /v2/start-scraping-task/{scraper_name}",
             "GET /v2/scraping-task-status/{task_id}"
         ],
         "available_scraper_names_for_start_task": ["liga_odds", "relevo_news", "tables_liga", "transfermarkt_general"]
     }
 
-def handle_scraper_response(data, endpoint_name: str):
-    print(f"Respuesta de {endpoint_name}: {json.dumps(data, indent=2, ensure_ascii=False, default=str)}")
+def render_json(data, status_code=200, headers=None, endpoint_name=None):
+    """JSONResponse whose serialization is timed (and reported in Server-Timing if enabled)."""
+    with timed("serialize", scraper=SCRAPER_KEYS.get(endpoint_name, endpoint_name)) as span:
+        response = FastJSONResponse(content=data, status_code=status_code, headers=headers)
+    if SERVER_TIMING:
+        serialize = f"serialize;dur={span['seconds'] * 1000:.1f}"
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = f"{existing}, {serialize}" if existing else serialize
+    return response
+
+def log_payload(endpoint_name, data, response):
+    """Summarize a response (counts and size) instead of dumping it; full bodies only when sampled.
+
+    Streaming responses have no body yet: only their status and counts are logged.
+    """
+    counts = {k: len(v) for k, v in data.items() if isinstance(v, (list, dict))}
+    body = getattr(response, "body", None)
+    size = f"{len(body)} bytes" if body is not None else "streaming"
+    logger.info(f"Respuesta de {endpoint_name}: {response.status_code}, {size}",
+                extra={"fields": {"endpoint": endpoint_name, "status": response.status_code,
+                                  **({"bytes": len(body)} if body is not None else {}), **counts}})
+    if body is not None and LOG_PAYLOAD_SAMPLE_RATE and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        logger.info(f"Respuesta completa de {endpoint_name}: {body.decode('utf-8')}")
+
+def diff_response(data, meta, since, headers, endpoint_name):
+    """Only the entries changed since version ``since``, or None if a full payload must be sent."""
+    if since is None or is_error_result(data) or not meta.get("etag"):
+        return None
+    if (diff := result_versions.diff(meta["key"], since, meta["etag"])) is None:
+        headers["X-Diff"] = "full"
+        return None
+    # El ETag describe el payload completo, no el diff
+    headers = {k: v for k, v in headers.items() if k != "ETag"}
+    headers["X-Diff"] = "incremental"
+    diff["scraped_at"] = data.get("scraped_at")
+    response = render_json(diff, 200, headers, endpoint_name)
+    log_payload(endpoint_name, diff, response)
+    return response
+
+def scraper_status(data, headers=None):
+    """HTTP status and headers for a scraper result; shared by the sync and the /v2 task API."""
     if "error" in data and data["error"] == "Failed to initialize browser":
-        return JSONResponse(content=data, status_code=503)
-    if "error_scraping" in data:
-        return JSONResponse(content=data, status_code=500)
-    if "error" in data: # Otros errores genéricos del scraper
-        return JSONResponse(content=data, status_code=500) 
-    # Si hay 'info' y no hay datos clave, es un 200 con info
-    if "info" in data and not any(k in data for k in ["matches", "articles", "leagues"]):
-        return JSONResponse(content=data, status_code=200)
-    return JSONResponse(content=data)
+        status_code = 503
+    elif data.get("error") == UPSTREAM_BUDGET_ERROR:
+        status_code = 503
+        headers = {**(headers or {}), "Retry-After": str(data.get("retry_after", 60))}
+    elif "error_scraping" in data:
+        status_code = 500
+    elif "error" in data: # Otros errores genéricos del scraper
+        status_code = 500
+    else: # Con 'info' y sin datos clave también es un 200
+        status_code = 200
+    return status_code, headers
+
+def handle_scraper_response(data, endpoint_name: str, headers=None):
+    status_code, headers = scraper_status(data, headers)
+    response = render_json(data, status_code, headers, endpoint_name)
+    log_payload(endpoint_name, data, response)
+    return response
 
 @app.get("/raspar-cuotas-liga")
-def endpoint_raspar_cuotas_liga():
-    print("Endpoint /raspar-cuotas-liga (síncrono) llamado.")
+def endpoint_raspar_cuotas_liga(request: Request):
+    logger.debug("Endpoint /raspar-cuotas-liga (síncrono) llamado.")
     try:
-        data = scrape_liga_odds()
-        return handle_scraper_response(data, "scrape_liga_odds")
+        data, meta = result_cache.get("liga_odds", scrape_liga_odds)
+        headers = cache_headers(data, meta)
+        if (not_modified := not_modified_response(request, headers)):
+            return not_modified
+        return handle_scraper_response(data, "scrape_liga_odds", headers=headers)
     except Exception as e:
-        print(f"ERROR CRÍTICO API (/raspar-cuotas-liga): {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+        logger.exception(f"ERROR CRÍTICO API (/raspar-cuotas-liga): {e}")
+        return FastJSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
 
 @app.get("/raspar-noticias-relevo")
-def endpoint_raspar_noticias_relevo():
-    print("Endpoint /raspar-noticias-relevo (síncrono) llamado.")
+def endpoint_raspar_noticias_relevo(request: Request, since: int = None, detalle: bool = False):
+    """Relevo transfer news; ``detalle=true`` adds each article's body and tags.
+
+    ``since`` is an ``X-Result-Version`` from an earlier response (an opaque identifier, not
+    an ordered number); if it is still known only the changes are sent (``X-Diff: incremental``).
+    """
+    logger.debug("Endpoint /raspar-noticias-relevo (síncrono) llamado.")
     try:
-        data = scrape_relevo_news()
-        return handle_scraper_response(data, "scrape_relevo_news")
+        key, scrape_fn = (RELEVO_DEEP_KEY, scrape_relevo_news_deep) if detalle else ("relevo_news", scrape_relevo_news)
+        data, meta = result_cache.get(key, scrape_fn)
+        headers = cache_headers(data, meta)
+        if (not_modified := not_modified_response(request, headers)):
+            return not_modified
+        if (diff := diff_response(data, meta, since, headers, scrape_fn.__name__)):
+            return diff
+        return handle_scraper_response(data, scrape_fn.__name__, headers=headers)
     except Exception as e:
-        print(f"ERROR CRÍTICO API (/raspar-noticias-relevo): {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+        logger.exception(f"ERROR CRÍTICO API (/raspar-noticias-relevo): {e}")
+        return FastJSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
 
 @app.get("/raspar-tablas-liga") 
-def endpoint_raspar_tablas_liga():
-    print("Endpoint /raspar-tablas-liga (síncrono) llamado.")
+def endpoint_raspar_tablas_liga(request: Request):
+    logger.debug("Endpoint /raspar-tablas-liga (síncrono) llamado.")
     try:
-        data = scrape_tablesleague_data()
-        # Este scraper no usa Selenium, así que el manejo de 'Failed to initialize browser' no aplica directamente.
-        if "error" in data: # Errores específicos de este scraper (HTTP, parsing)
-            status_code = 500
-            if "No se encontró el contenedor principal" in data["error"] or "No se encontraron cabeceras de título" in data["error"]:
-                status_code = 404 # O 503 si el sitio fuente está mal
-            elif "Fallo en la petición HTTP" in data["error"]:
-                status_code = 502 # Bad Gateway
-            return JSONResponse(content=data, status_code=status_code)
-        if "info" in data and not data.get("leagues"):
-            return JSONResponse(content=data, status_code=200) # OK, pero sin datos de ligas
-        return JSONResponse(content=data)
+        data, meta = result_cache.get("tables_liga", scrape_tablesleague_data)
+        headers = cache_headers(data, meta)
+        if (not_modified := not_modified_response(request, headers)):
+            return not_modified
+        # Reglas comunes (presupuesto agotado -> 503 con Retry-After); después, los errores propios de este scraper
+        status_code, headers = scraper_status(data, headers)
+        error = data.get("error") if status_code == 500 else None
+        if error and ("No se encontró el contenedor principal" in error or "No se encontraron cabeceras de título" in error):
+            status_code = 404 # O 503 si el sitio fuente está mal
+        elif error and "Fallo en la petición HTTP" in error:
+            status_code = 502 # Bad Gateway
+        response = render_json(data, status_code, headers, "scrape_tablesleague_data")
+        log_payload("scrape_tablesleague_data", data, response)
+        return response
     except Exception as e:
-        print(f"ERROR CRÍTICO API (/raspar-tablas-liga): {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+        logger.exception(f"ERROR CRÍTICO API (/raspar-tablas-liga): {e}")
+        return FastJSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
 
 @app.get("/raspar-cuotas-generales-transfermarkt")
-def endpoint_raspar_cuotas_generales_transfermarkt():
-    print("Endpoint /raspar-cuotas-generales-transfermarkt (síncrono) llamado.")
+def endpoint_raspar_cuotas_generales_transfermarkt(request: Request, since: int = None):
+    """Transfermarkt general odds; ``since`` works as in /raspar-noticias-relevo."""
+    logger.debug("Endpoint /raspar-cuotas-generales-transfermarkt (síncrono) llamado.")
+    try:
+        data, meta = result_cache.get("transfermarkt_general", scrape_transfermarkt_general_odds)
+        headers = cache_headers(data, meta)
+        if (not_modified := not_modified_response(request, headers)):
+            return not_modified
+        if (diff := diff_response(data, meta, since, headers, "scrape_transfermarkt_general_odds")):
+            return diff
+        return handle_scraper_response(data, "scrape_transfermarkt_general_odds", headers=headers)
+    except Exception as e:
+        logger.exception(f"ERROR CRÍTICO API (/raspar-cuotas-generales-transfermarkt): {e}")
+        return FastJSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+
+# ----- Endpoint agregado: todos los scrapers en paralelo -----
+BROWSER_SCRAPERS = {"liga_odds", "relevo_news", "transfermarkt_general"}
+# Compuestos: no piden nada por sí mismos, sus partes (listado y artículos) se limitan una a una
+COMPOSITE_SCRAPERS = {RELEVO_DEEP_KEY}
+_default_aggregate_timeout = float(os.environ.get("AGGREGATE_TIMEOUT_SECONDS", 45))
+AGGREGATE_TIMEOUTS = {name: float(os.environ.get(f"AGGREGATE_TIMEOUT_{name.upper()}", _default_aggregate_timeout))
+                      for name in SCRAPERS}
+aggregate_executor = ThreadPoolExecutor(max_workers=len(SCRAPERS) * 2, thread_name_prefix="aggregate")
+
+async def _aggregate_one(name, timeout, executor=aggregate_executor):
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    try:
+        data, meta = await asyncio.wait_for(
+            loop.run_in_executor(executor, result_cache.get, name, ALL_SCRAPERS[name]), timeout)
+        entry = {"status": "error" if is_error_result(data) else "ok", "cache": meta["status"], "data": data}
+    except asyncio.TimeoutError:
+        # El scrape sigue en su hilo y rellenará la caché al terminar
+        entry = {"status": "timeout", "error": f"Scraper '{name}' no respondió en {timeout}s"}
+    except Exception as e:
+        logger.exception(f"ERROR en /raspar-todo ({name}): {e}")
+        entry = {"status": "error", "error": str(e)}
+    entry["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return name, entry
+
+def _aggregate_tasks(timeout):
+    return [asyncio.ensure_future(_aggregate_one(name, timeout or AGGREGATE_TIMEOUTS[name])) for name in SCRAPERS]
+
+@app.get("/raspar-todo")
+async def endpoint_raspar_todo(timeout: float = None):
+    logger.debug("Endpoint /raspar-todo llamado.")
+    results = dict(await asyncio.gather(*_aggregate_tasks(timeout)))
+    status_code = 200 if any(r["status"] == "ok" for r in results.values()) else 502
+    return FastJSONResponse(content={"scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "results": results},
+                        status_code=status_code)
+
+@app.get("/raspar-todo/stream")
+async def endpoint_raspar_todo_stream(timeout: float = None):
+    """NDJSON: one line per scraper, written as soon as that scraper finishes."""
+    logger.debug("Endpoint /raspar-todo/stream llamado.")
+    async def lines():
+        for next_done in asyncio.as_completed(_aggregate_tasks(timeout)):
+            name, entry = await next_done
+            yield dumps_bytes({"scraper": name, **entry}) + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# ----- Cuotas por liga (registro LEAGUES) -----
+# Tope de scrapes de liga simultáneos en el modo lote; los que caigan a Chrome además comparten browser_scrape_slots
+league_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("LEAGUE_BATCH_CONCURRENCY", 4)),
+                                     thread_name_prefix="league")
+
+def _invalid_league(league):
+    return FastJSONResponse(content={"error": f"Invalid league '{league}'", "available": list(LEAGUES)}, status_code=400)
+
+@app.get("/raspar-cuotas")
+async def endpoint_raspar_cuotas_lote(ligas: str = None, timeout: float = None):
+    """Batch mode: every league in ``ligas`` (comma separated, default all) scraped in parallel."""
+    slugs = [s.strip() for s in ligas.split(",") if s.strip()] if ligas else list(LEAGUES)
+    if (unknown := next((s for s in slugs if s not in LEAGUES), None)):
+        return _invalid_league(unknown)
+    keyed = await asyncio.gather(*(
+        _aggregate_one(league_cache_key(slug), timeout or AGGREGATE_TIMEOUTS["liga_odds"], league_executor)
+        for slug in slugs))
+    results = {slug: entry for slug, (_, entry) in zip(slugs, keyed)}
+    status_code = 200 if any(r["status"] == "ok" for r in results.values()) else 502
+    return FastJSONResponse(content={"scraped_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "results": results},
+                        status_code=status_code)
+
+@app.get("/raspar-cuotas/{league}")
+def endpoint_raspar_cuotas(league: str, request: Request):
+    logger.debug(f"Endpoint /raspar-cuotas/{league} llamado.")
+    if league not in LEAGUES:
+        return _invalid_league(league)
+    try:
+        data, meta = result_cache.get(league_cache_key(league), LEAGUE_SCRAPERS[league])
+        headers = cache_headers(data, meta)
+        if (not_modified := not_modified_response(request, headers)):
+            return not_modified
+        return handle_scraper_response(data, LEAGUE_SCRAPERS[league].__name__, headers=headers)
+    except Exception as e:
+        logger.exception(f"ERROR CRÍTICO API (/raspar-cuotas/{league}): {e}")
+        return FastJSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+
+# ----- Planificador: refresco periódico de cada fuente en segundo plano -----
+def seconds_until_next_expiry(data, now=None):
+    """Seconds until the nearest future ``expiryTime`` among the general offers, or None."""
+    now = now or datetime.now().astimezone()
+    remaining = []
+    for match in (data or {}).get("matches", []):
+        if (expiry := match.get("expiryTime")) in (None, "", "N/A"):
+            continue
+        try:
+            expiry_dt = parse(expiry)
+        except (ValueError, OverflowError):
+            continue
+        if expiry_dt.tzinfo is None:
+            expiry_dt = expiry_dt.astimezone()
+        if (seconds := (expiry_dt - now).total_seconds()) > 0:
+            remaining.append(seconds)
+    return min(remaining) if remaining else None
+
+class ScrapeScheduler:
+    """Refreshes every scraper into ``result_cache`` on its own cadence.
+
+    Each source runs in its own thread: it scrapes through ``result_cache.refresh`` (so
+    it shares the single-flight with API requests) and then sleeps its interval +/-
+    ``jitter``. Failures double the delay up to ``max_backoff``. Scrapes that fall back
+    to Chrome share ``browser_scrape_slots`` with /raspar-todo. Sources listed in ``expiry_aware`` wake up shortly after their
+    nearest ``expiryTime`` if that comes before the next regular run.
+    """
+
+    def __init__(self, intervals, jitter=0.1, max_backoff=1800, min_interval=15, expiry_aware=()):
+        self.intervals = intervals
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.min_interval = min_interval
+        self.expiry_aware = set(expiry_aware)
+        self.state = {name: {"runs": 0, "failures": 0, "last_success": None, "last_error": None, "next_run_at": None}
+                      for name in intervals}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for name in self.intervals:
+            t = threading.Thread(target=self._loop, args=(name,), name=f"scheduler-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"ScrapeScheduler: iniciado para {', '.join(f'{n}={i:g}s' for n, i in self.intervals.items())}.")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def next_delay(self, name, data=None):
+        """Delay before the next run of ``name`` given the outcome of the last one."""
+        state = self.state[name]
+        delay = self.intervals[name]
+        if state["failures"]:
+            delay = min(self.max_backoff, delay * 2 ** state["failures"])
+        elif name in self.expiry_aware and (until_expiry := seconds_until_next_expiry(data)) is not None:
+            # Un poco después de que caduque la oferta más próxima, para recoger la que la sustituye
+            delay = min(delay, max(self.min_interval, until_expiry + 1))
+        return max(self.min_interval, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _run_once(self, name):
+        state = self.state[name]
+        state["runs"] += 1
+        data = None
+        try:
+            # Con varios workers, el primero en despertar scrapea y el resto adopta su resultado
+            data = result_cache.refresh(name, ALL_SCRAPERS[name], fresh_within=self.intervals[name] / 2)
+            if is_error_result(data):
+                raise RuntimeError(data.get("error") or data.get("error_scraping"))
+            state["failures"], state["last_error"] = 0, None
+            state["last_success"] = datetime.now().isoformat()
+            metrics.inc("scheduler_runs_total", scraper=name, outcome="success")
+        except UpstreamBudgetExhausted as e:
+            # No es un fallo de la fuente: se reintenta en el intervalo normal, sin backoff
+            metrics.inc("scheduler_runs_total", scraper=name, outcome="budget")
+            logger.info(f"ScrapeScheduler: '{name}' aplazado: {e}")
+        except Exception as e:
+            state["failures"] += 1
+            state["last_error"] = str(e)
+            metrics.inc("scheduler_runs_total", scraper=name, outcome="error")
+            logger.warning(f"ScrapeScheduler: fallo en '{name}' ({state['failures']} seguido(s)): {e}")
+        return data
+
+    def _loop(self, name):
+        # Arranque escalonado para no lanzar todas las fuentes a la vez
+        delay = random.uniform(0, min(5.0, self.intervals[name] * self.jitter))
+        while not self._stop.wait(delay):
+            data = self._run_once(name)
+            delay = self.next_delay(name, data)
+            self.state[name]["next_run_at"] = (datetime.now() + timedelta(seconds=delay)).isoformat()
+
+    def status(self):
+        return {name: {"interval": self.intervals[name], **state} for name, state in self.state.items()}
+
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() == "true"
+# Ofertas generales con cuenta atrás: rápido; tablas de clasificación: lento
+DEFAULT_SCHEDULE_INTERVALS = {"liga_odds": 180, "relevo_news": 300, "tables_liga": 1800, "transfermarkt_general": 60}
+# Ligas adicionales a mantener frescas, p. ej. SCHEDULED_LEAGUES=premier-league,serie-a ("" = ninguna)
+SCHEDULED_LEAGUES = [s for s in os.environ.get("SCHEDULED_LEAGUES", ",".join(LEAGUES)).split(",") if s in LEAGUES]
+_scheduled_keys = [*SCRAPERS, *(league_cache_key(s) for s in SCHEDULED_LEAGUES if league_cache_key(s) not in SCRAPERS)]
+# En el perfil "http" solo se programan las fuentes sin navegador; las demás las refrescan los workers con Chrome
+_scheduled_keys = [k for k in _scheduled_keys if BROWSER_ENABLED or k.partition(":")[0] not in BROWSER_SCRAPERS]
+scrape_scheduler = ScrapeScheduler(
+    # Las ligas adicionales comparten SCHEDULE_INTERVAL_LIGA_ODDS
+    intervals={name: float(os.environ.get(f"SCHEDULE_INTERVAL_{name.partition(':')[0].upper()}",
+                                          DEFAULT_SCHEDULE_INTERVALS.get(name.partition(":")[0], 300)))
+               for name in _scheduled_keys},
+    jitter=float(os.environ.get("SCHEDULER_JITTER", 0.1)),
+    max_backoff=float(os.environ.get("SCHEDULER_MAX_BACKOFF_SECONDS", 1800)),
+    min_interval=float(os.environ.get("SCHEDULER_MIN_INTERVAL_SECONDS", 15)),
+    expiry_aware={"transfermarkt_general"},
+)
+
+@app.get("/navegadores")
+def endpoint_navegadores():
+    return FastJSONResponse(content={"profile": DEPLOYMENT_PROFILE, "browser_enabled": BROWSER_ENABLED,
+                                     "backends": backend_load_times, **browser_supervisor.status(),
+                                     "readiness": adaptive_timeouts.status()})
+
+@app.get("/limites")
+def endpoint_limites():
+    return FastJSONResponse(content={
+        "rate_limit": {"enabled": RATE_LIMIT_ENABLED, "exempt": sorted(RATE_LIMIT_EXEMPT),
+                       "workers": WEB_CONCURRENCY, "scrape_routes": list(SCRAPE_ROUTE_PREFIXES)},
+        "upstream_budget": {"enabled": UPSTREAM_BUDGET_ENABLED, **upstream_budget.status()},
+    })
+
+@app.get("/planificador")
+def endpoint_planificador():
+    return FastJSONResponse(content={"enabled": SCHEDULER_ENABLED, "sources": scrape_scheduler.status()})
+
+# ----- Eventos de cuotas en tiempo real (SSE / WebSocket) -----
+PUSH_KEEPALIVE_SECONDS = float(os.environ.get("PUSH_KEEPALIVE_SECONDS", 15))
+
+def _event_sources(fuentes):
+    """Parse ``?fuentes=a,b``; returns (sources or None, error response or None)."""
+    if not fuentes:
+        return None, None
+    sources = {s.strip() for s in fuentes.split(",") if s.strip()}
+    if (unknown := sources - set(ODDS_SOURCES)):
+        return None, FastJSONResponse(content={"error": f"Invalid source(s): {', '.join(sorted(unknown))}",
+                                           "available": ODDS_SOURCES}, status_code=400)
+    return sources, None
+
+async def _next_event(subscriber):
+    """Next queued event, or None after ``PUSH_KEEPALIVE_SECONDS`` without one."""
     try:
-        data = scrape_transfermarkt_general_odds()
-        return handle_scraper_response(data, "scrape_transfermarkt_general_odds")
+        return await asyncio.wait_for(subscriber.queue.get(), PUSH_KEEPALIVE_SECONDS)
+    except asyncio.TimeoutError:
+        return None
+
+@app.get("/eventos-cuotas")
+async def endpoint_eventos_cuotas(fuentes: str = None):
+    """Server-Sent Events: odd_changed / new_offer / offer_removed / offer_expired."""
+    sources, error = _event_sources(fuentes)
+    if error:
+        return error
+    if (subscriber := odds_event_broker.subscribe(sources)) is None:
+        return FastJSONResponse(content={"error": "Demasiados suscriptores, reintenta más tarde"}, status_code=503,
+                            headers={"Retry-After": "30"})
+    async def stream():
+        try:
+            yield b": conectado\n\n"
+            while True:
+                if (item := await _next_event(subscriber)) is None:
+                    yield b": keepalive\n\n"
+                    continue
+                event_id, kind, payload = item
+                yield (f"id: {event_id}\n" if event_id else "").encode() + f"event: {kind}\ndata: ".encode() + payload + b"\n\n"
+                if kind == "dropped":
+                    break
+        finally:
+            odds_event_broker.unsubscribe(subscriber)
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/eventos-cuotas")
+async def websocket_eventos_cuotas(websocket: WebSocket, fuentes: str = None):
+    sources, error = _event_sources(fuentes)
+    if error or (subscriber := odds_event_broker.subscribe(sources)) is None:
+        await websocket.close(code=1008 if error else 1013)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            if (item := await _next_event(subscriber)) is None:
+                await websocket.send_text('{"type":"keepalive"}')
+                continue
+            _, kind, payload = item
+            await websocket.send_text(payload.decode("utf-8"))
+            if kind == "dropped":
+                await websocket.close(code=1013)
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        odds_event_broker.unsubscribe(subscriber)
+
+# ----- Métricas -----
+@app.get("/metrics")
+def endpoint_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ----- Histórico de cuotas (sin scraping) -----
+@app.get("/cuotas-ultimas/{source}")
+def endpoint_cuotas_ultimas(source: str, incluir_antiguas: bool = False):
+    if source not in ODDS_SOURCES:
+        return FastJSONResponse(content={"error": "Invalid source", "available": ODDS_SOURCES}, status_code=400)
+    scraped_at, rows = snapshot_store.latest(source, include_stale=incluir_antiguas)
+    if scraped_at is None:
+        return FastJSONResponse(content={"error": "No hay snapshots guardados todavía", "source": source}, status_code=404)
+    return FastJSONResponse(content={"source": source, "scraped_at": scraped_at, "odds": rows})
+
+@app.get("/historial-cuotas/{source}")
+def endpoint_historial_cuotas(source: str, partido: str = None, casa: str = None,
+                              desde: str = None, hasta: str = None, limit: int = 5000):
+    """Odds movements; ``desde``/``hasta`` use the ``scraped_at`` format (YYYY-MM-DD HH:MM:SS)."""
+    if source not in ODDS_SOURCES:
+        return FastJSONResponse(content={"error": "Invalid source", "available": ODDS_SOURCES}, status_code=400)
+    movements = snapshot_store.history(source, match=partido, bookmaker=casa, since=desde, until=hasta,
+                                       limit=max(1, min(limit, 50000)))
+    series = {}
+    for m in movements:
+        key = (m["match_key"], m["bookmaker"], m["bet_type"])
+        series.setdefault(key, []).append({"odd": m["odd"], "odd_value": m["odd_value"], "observed_at": m["observed_at"]})
+    return FastJSONResponse(content={
+        "source": source, "desde": desde, "hasta": hasta,
+        "series": [{"match": k[0], "bookmaker": k[1], "bet_type": k[2], "points": points} for k, points in series.items()],
+    })
+
+# ----- Exportación columnar (análisis) -----
+def export_response(fields, rows, fmt, name, headers):
+    with timed("export", scraper=name):
+        columns, count = rows_to_columns(fields, rows)
+        body = encode_columns(columns, fmt)
+    media_type, extension = EXPORT_FORMATS[fmt]
+    headers = {**headers, "X-Record-Count": str(count),
+               "Content-Disposition": f'attachment; filename="{name.replace(":", "-")}.{extension}"'}
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def _export_format_error(formato):
+    if formato not in EXPORT_FORMATS:
+        return FastJSONResponse(content={"error": f"Invalid format '{formato}'", "available": list(EXPORT_FORMATS)},
+                                status_code=400)
+    if formato != "csv" and load_backend("arrow") is None:
+        return FastJSONResponse(content={"error": f"El formato '{formato}' requiere pyarrow, que no está instalado",
+                                         "available": ["csv"]}, status_code=501)
+    return None
+
+@app.get("/exportar/{scraper}")
+def endpoint_exportar(scraper: str, request: Request, formato: str = "csv"):
+    """The cached result of ``scraper`` as flat rows in a columnar format (csv, arrow or parquet)."""
+    if scraper not in ALL_SCRAPERS or not (layout := export_layout(scraper)):
+        return FastJSONResponse(content={"error": f"Invalid scraper '{scraper}'",
+                                         "available": [k for k in ALL_SCRAPERS if export_layout(k)]}, status_code=400)
+    if (error := _export_format_error(formato)):
+        return error
+    try:
+        data, meta = result_cache.get(scraper, ALL_SCRAPERS[scraper])
+        if is_error_result(data):
+            return handle_scraper_response(data, ALL_SCRAPERS[scraper].__name__)
+        headers = cache_headers(data, meta)
+        # Cada formato es una representación distinta del mismo payload
+        if (etag := headers.get("ETag")):
+            headers["ETag"] = f'{etag[:-1]}-{formato}"'
+        if (not_modified := not_modified_response(request, headers)):
+            return not_modified
+        fields, rows = layout
+        return export_response(fields, rows(data), formato, scraper, headers)
     except Exception as e:
-        print(f"ERROR CRÍTICO API (/raspar-cuotas-generales-transfermarkt): {e}\n{traceback.format_exc()}")
-        return JSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+        logger.exception(f"ERROR CRÍTICO API (/exportar/{scraper}): {e}")
+        return FastJSONResponse(content={"error": "Error interno del servidor", "details": str(e)}, status_code=500)
+
+@app.get("/exportar-historial/{source}")
+def endpoint_exportar_historial(source: str, formato: str = "csv", partido: str = None, casa: str = None,
+                                desde: str = None, hasta: str = None, limit: int = 100000):
+    """Odds movements from the snapshot store in a columnar format (same filters as /historial-cuotas)."""
+    if source not in ODDS_SOURCES:
+        return FastJSONResponse(content={"error": "Invalid source", "available": ODDS_SOURCES}, status_code=400)
+    if (error := _export_format_error(formato)):
+        return error
+    movements = snapshot_store.history(source, match=partido, bookmaker=casa, since=desde, until=hasta,
+                                       limit=max(1, min(limit, 1000000)))
+    return export_response(ODDS_MOVEMENT_FIELDS, odds_movement_rows(movements), formato, f"{source}-historial", {})
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     host_to_bind = os.environ.get("HOST", "0.0.0.0") # Para Railway y contenedores
-    reload_status = os.environ.get("UVICORN_RELOAD", "true").lower() == "true" # Controlar reload
-    
-    print(f"Intentando ejecutar Uvicorn en host {host_to_bind}, puerto {port}. Reload: {reload_status}")
-    uvicorn.run("final:app", host=host_to_bind, port=port, reload=reload_status)
\ No newline at end of file
+    # reload solo para desarrollo (UVICORN_RELOAD=true); no es compatible con varios workers
+    reload_status = os.environ.get("UVICORN_RELOAD", "false").lower() == "true" and WEB_CONCURRENCY == 1
+
+    logger.info(f"Intentando ejecutar Uvicorn en host {host_to_bind}, puerto {port}. Reload: {reload_status}, "
+                f"workers: {WEB_CONCURRENCY}, caché compartida: {type(shared_store).__name__ if shared_store else 'no'}")
+    uvicorn.run("final:app", host=host_to_bind, port=port, reload=reload_status, workers=WEB_CONCURRENCY)